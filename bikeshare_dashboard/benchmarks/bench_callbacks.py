@@ -0,0 +1,254 @@
+"""
+Benchmark the dashboard callbacks outside a browser.
+
+Each callback (and each Flask route behind a callback, such as the map and
+the downloads) is called directly with representative inputs against a
+synthetic dataset from ``synthetic.py``. The report lists latency percentiles
+per callback, the peak memory allocated by one call, and the resident memory
+of the app process once the data is loaded and at the end of the run.
+
+Every dataset size runs in its own process, since the app loads its data at
+import time. Generated datasets are kept in ``--data-dir`` and reused.
+
+Run from the ``benchmarks`` directory:
+
+    python bench_callbacks.py --rows 1000000 10000000 50000000
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+
+import numpy as np
+
+from synthetic import write_dataset
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+PERCENTILES = [50, 90, 99]
+
+
+def benchmark_cases(app):
+    """
+    List the callback invocations to time, with inputs spanning the loaded data.
+
+    Args:
+        app (module): The imported dashboard module.
+
+    Returns:
+        list: ``(name, call)`` pairs, where ``call`` runs one invocation.
+    """
+    year = (str(app.first_day), str(app.last_day))
+    month = (str(app.last_day.replace(day=1)), str(app.last_day))
+    week = (str(app.last_day - timedelta(days=6)), str(app.last_day))
+    client = app.server.test_client()
+
+    def get(url):
+        response = client.get(url)
+        assert response.status_code == 200, f"{url} returned {response.status_code}"
+        return response.get_data()
+
+    trends_all = ('both', ['all'], 'departure count', [0, 3])
+    trends_filtered = ('electric', ['Pay Per Ride', '24 Hour'], 'covered distance', [1, 2])
+
+    return [
+        ('update_first_row_cards[year]', lambda: app.update_first_row_cards(*year)),
+        ('update_first_row_cards[month]', lambda: app.update_first_row_cards(*month)),
+        ('update_first_row_cards[week]', lambda: app.update_first_row_cards(*week)),
+        ('update_first_col_cards[year]', lambda: app.update_first_col_cards(*year)),
+        ('update_second_col_cards[year]', lambda: app.update_second_col_cards(*year)),
+        ('update_trends[all]', lambda: app.update_trends(*trends_all)),
+        ('update_trends[filtered]', lambda: app.update_trends(*trends_filtered)),
+        ('update_card[all]', lambda: app.update_card(*trends_all)),
+        ('update_chart[all]', lambda: app.update_chart(*trends_all)),
+        ('update_chart[filtered]', lambda: app.update_chart(*trends_filtered)),
+        ('update_polar[all]', lambda: app.update_polar('both', ['all'], [0, 3])),
+        ('create_day_of_week_bar_plot[all]', lambda: app.create_day_of_week_bar_plot('both', ['all'], [0, 3])),
+        ('update_map', lambda: app.update_map(lambda progress: None, [0, 11], 'both', 'marker plot', 'all')),
+        ('map_view[marker, all]', lambda: get(app.map_view_url(((0, 11), 'both', 'marker plot', 'all')))),
+        ('map_view[density, top20]', lambda: get(app.map_view_url(((5, 7), 'electric', 'density plot', 'top20')))),
+        ('update_export_link', lambda: app.update_export_link(*week, 'both', ['all'], 'csv')),
+        ('download_zip', lambda: get(app.app.get_relative_path('/download/raw-data'))),
+        ('export_trips[week, csv]', lambda: get(app.export_url(*week, 'both', ['all'], 'csv'))),
+        ('export_trips[month, parquet]', lambda: get(app.export_url(*month, 'classic', ['all'], 'parquet'))),
+    ]
+
+
+def clear_caches(app):
+    """
+    Drop the app's memoized results so every call does its full work.
+
+    Besides each worker's caches, this empties the store of rendered maps and
+    the shared cache, if configured, which would otherwise answer the map
+    calls without rendering.
+    """
+    for cache in app.result_caches.values():
+        cache.clear()
+    app.map_store.clear()
+    if app.shared_cache is not None:
+        app.shared_cache.clear()
+
+
+def max_rss_bytes():
+    """Return the peak resident memory of this process so far."""
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def run_worker(repeat, warm, skip):
+    """
+    Import the app and time every benchmark case in this process.
+
+    Args:
+        repeat (int): Timed calls per case.
+        warm (bool): Keep the app's caches between calls instead of clearing them.
+        skip (list): Case name prefixes to leave out.
+
+    Returns:
+        dict: The load time and memory of the app and the results per case.
+    """
+    sys.path.insert(0, SRC_DIR)
+    start = time.perf_counter()
+    import app
+    load_seconds = time.perf_counter() - start
+    load_rss = max_rss_bytes()
+
+    # Build the download zip up front, as ingest.py would, so download_zip
+    # measures serving it rather than the one-off build
+    if not any('download_zip'.startswith(prefix) for prefix in skip):
+        start = time.perf_counter()
+        app.export_zip()
+        export_build_seconds = time.perf_counter() - start
+    else:
+        export_build_seconds = None
+
+    results = {}
+    for name, call in benchmark_cases(app):
+        if any(name.startswith(prefix) for prefix in skip):
+            continue
+
+        # One untimed call under tracemalloc measures the memory a call allocates
+        clear_caches(app)
+        tracemalloc.start()
+        call()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        samples = []
+        for _ in range(repeat):
+            if not warm:
+                clear_caches(app)
+            start = time.perf_counter()
+            call()
+            samples.append(time.perf_counter() - start)
+
+        results[name] = {
+            'samples': samples,
+            'peak_alloc_bytes': peak_bytes,
+            **{f'p{p}': float(np.percentile(samples, p)) for p in PERCENTILES},
+            'max': max(samples),
+        }
+
+    return {
+        'rows': len(app.combined_df),
+        'load_seconds': load_seconds,
+        'export_build_seconds': export_build_seconds,
+        'load_rss_bytes': load_rss,
+        'peak_rss_bytes': max_rss_bytes(),
+        'cases': results,
+    }
+
+
+def run_size(rows, data_dir, repeat, warm, skip):
+    """
+    Benchmark one dataset size in a fresh process, generating the data if needed.
+
+    Args:
+        rows (int): Number of synthetic trips.
+        data_dir (str): Directory holding the generated datasets.
+        repeat (int): Timed calls per case.
+        warm (bool): Keep the app's caches between calls.
+        skip (list): Case name prefixes to leave out.
+
+    Returns:
+        dict: The worker's results.
+    """
+    dataset_dir = os.path.join(data_dir, f'rows-{rows}')
+    if not os.path.exists(os.path.join(dataset_dir, 'manifest.json')):
+        print(f"Generating {rows} synthetic trips in {dataset_dir}", file=sys.stderr)
+        write_dataset(dataset_dir, rows)
+
+    command = [sys.executable, os.path.abspath(__file__), '--worker', '--repeat', str(repeat)]
+    if warm:
+        command.append('--warm')
+    if skip:
+        command += ['--skip', *skip]
+
+    # Keep the run's map store and background jobs (and a SQLite shared cache)
+    # out of the app's JOBS_DIR, so maps rendered by earlier runs are not reused
+    with tempfile.TemporaryDirectory() as jobs_dir:
+        env = dict(os.environ, MOBI_PROCESSED_DIR=dataset_dir, JOBS_DIR=jobs_dir)
+        if env.get('SHARED_CACHE_URL', '').startswith('sqlite:///'):
+            env['SHARED_CACHE_URL'] = f"sqlite:///{os.path.join(jobs_dir, 'shared.db')}"
+        output = subprocess.run(command, env=env, check=True, stdout=subprocess.PIPE, text=True).stdout
+    return json.loads(output)
+
+
+def print_report(result):
+    """Print one dataset size's results as a table."""
+    mb = 1024 * 1024
+    export_build = result['export_build_seconds']
+    print(f"\n{result['rows']} trips: loaded in {result['load_seconds']:.1f} s, "
+          f"RSS {result['load_rss_bytes'] / mb:.0f} MB after load, {result['peak_rss_bytes'] / mb:.0f} MB peak"
+          + (f", download zip built in {export_build:.1f} s" if export_build is not None else ""))
+
+    header = f"{'callback':<36}" + ''.join(f"{f'p{p} ms':>10}" for p in PERCENTILES) + f"{'max ms':>10}{'alloc MB':>10}"
+    print(header)
+    print('-' * len(header))
+    for name, case in result['cases'].items():
+        print(
+            f"{name:<36}"
+            + ''.join(f"{case[f'p{p}'] * 1000:>10.1f}" for p in PERCENTILES)
+            + f"{case['max'] * 1000:>10.1f}{case['peak_alloc_bytes'] / mb:>10.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard callbacks against synthetic trips.")
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000, 50_000_000],
+                        help="dataset sizes to benchmark")
+    parser.add_argument('--data-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'),
+                        help="directory holding the generated datasets")
+    parser.add_argument('--repeat', type=int, default=5, help="timed calls per callback")
+    parser.add_argument('--warm', action='store_true', help="keep the app's caches between calls")
+    parser.add_argument('--skip', nargs='+', default=[], help="callback name prefixes to leave out")
+    parser.add_argument('--output', help="also write the results as JSON to this file")
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        # The app logs to stderr, so stdout only carries the results
+        json.dump(run_worker(args.repeat, args.warm, args.skip), sys.stdout)
+        return
+
+    results = []
+    for rows in args.rows:
+        result = run_size(rows, args.data_dir, args.repeat, args.warm, args.skip)
+        print_report(result)
+        results.append(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""
+Generate synthetic Mobi trips at any scale for benchmarking.
+
+The trips follow the processed schema written by ``ingest.py`` (the raw Mobi
+columns plus ``Month``, ``Season`` and ``Day of Week``, in the compact
+``TRIP_DTYPES``) and are written as monthly partitions with a manifest, so the
+app loads them exactly like real data when ``MOBI_PROCESSED_DIR`` points at
+the output directory. Stations are the real stations from
+``station_coordinates.csv``, and membership types, trip lengths, temperatures
+and stopovers follow the shape of the 2023 exports.
+
+Run from the ``benchmarks`` directory:
+
+    python synthetic.py --rows 1000000 --output-dir /tmp/mobi-1m
+"""
+
+import argparse
+import calendar
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from ingest import (  # noqa: E402
+    MONTHS, SEASONS, TRIP_DTYPES, load_station_coordinates, write_manifest, write_parquet
+)
+from queries import sort_by_departure  # noqa: E402
+
+# Share of trips per membership type, as in the 2023 exports
+MEMBERSHIP_SHARES = {
+    'Pay Per Ride': 0.198,
+    '365 Day Pass Standard': 0.158,
+    '30 Day Pass': 0.117,
+    '365 Day Pass Plus': 0.102,
+    '24 Hour': 0.085,
+    '365 Corporate Plus Renewal': 0.041,
+    '365 Corporate Plus': 0.039,
+    '365 Corporate Standard': 0.035,
+    '365 Day Pass Plus SALE': 0.035,
+    'Community Pass': 0.030,
+    '365 Day Pass Standard SALE': 0.029,
+    'VIP': 0.027,
+    'Community Pass E-bike': 0.024,
+    'Community Pass E-bike (PWD)': 0.024,
+    '365 Corporate Standard Renewal': 0.019,
+    '365 Day Founding Standard': 0.017,
+    '365 Day Founding Plus': 0.016,
+    'UBC Inclusive Corporate Pass': 0.004,
+    'Archived Monthly Standard': 0.001,
+    'Herbaland Pass': 0.001,
+    'Archived Monthly Plus': 0.001,
+    'Limited Classic Bikes Only (60 min)': 0.001,
+}
+
+# Relative number of trips per month, peaking in summer
+MONTH_WEIGHTS = np.array([0.45, 0.5, 0.7, 0.85, 1.05, 1.2, 1.35, 1.35, 1.15, 0.9, 0.6, 0.45])
+
+# Relative number of departures per hour of the day, with commute peaks
+HOUR_WEIGHTS = np.array([
+    0.3, 0.2, 0.1, 0.1, 0.1, 0.3, 0.8, 1.6, 2.0, 1.3, 1.1, 1.3,
+    1.5, 1.5, 1.5, 1.7, 2.1, 2.4, 1.9, 1.4, 1.1, 0.9, 0.7, 0.5,
+])
+
+ELECTRIC_SHARE = 0.32
+MISSING_MEMBERSHIP_SHARE = 0.0015
+STOPOVER_SHARES = [0.97, 0.022, 0.005, 0.002, 0.001]
+
+
+def month_rows(rows, years):
+    """
+    Split a total number of trips over the months of the given years.
+
+    Args:
+        rows (int): Total number of trips.
+        years (list): Years to generate, e.g. ``[2023]``.
+
+    Returns:
+        list: ``(year, month, rows)`` tuples summing to ``rows``.
+    """
+    weights = np.tile(MONTH_WEIGHTS, len(years))
+    counts = np.floor(rows * weights / weights.sum()).astype(np.int64)
+    counts[:rows - counts.sum()] += 1
+    return [(year, month, int(counts[i * 12 + month - 1])) for i, year in enumerate(years) for month in range(1, 13)]
+
+
+def generate_month(rng, year, month, rows, stations):
+    """
+    Generate one month of synthetic trips in the processed schema.
+
+    Args:
+        rng (numpy.random.Generator): Source of randomness.
+        year (int): Year of the trips.
+        month (int): Month of the trips (1 is January).
+        rows (int): Number of trips.
+        stations (pandas.Index): Station names, most popular first.
+
+    Returns:
+        pandas.DataFrame: The trips, sorted by departure time.
+    """
+    days = calendar.monthrange(year, month)[1]
+    minutes = (
+        rng.integers(0, days, rows) * 1440
+        + rng.choice(24, rows, p=HOUR_WEIGHTS / HOUR_WEIGHTS.sum()) * 60
+        + rng.integers(0, 60, rows)
+    )
+    departure = pd.Timestamp(year, month, 1).to_datetime64() + minutes.astype('timedelta64[m]')
+
+    duration = np.clip(rng.lognormal(np.log(620), 0.9, rows), 60, 6 * 3600).astype(np.int32)
+    distance = (duration * rng.lognormal(np.log(2.5), 0.35, rows)).astype(np.float32)
+    returned = (departure + duration.astype('timedelta64[s]')).astype('datetime64[m]').astype('datetime64[ns]')
+
+    # Popularity falls off with station rank, like the real departure counts
+    station_weights = 1 / np.arange(1, len(stations) + 1) ** 0.8
+    station_weights /= station_weights.sum()
+    station_dtype = pd.CategoricalDtype(stations)
+
+    memberships = list(MEMBERSHIP_SHARES)
+    shares = np.array(list(MEMBERSHIP_SHARES.values()))
+    membership_codes = rng.choice(len(memberships), rows, p=shares / shares.sum())
+    membership_codes[rng.random(rows) < MISSING_MEMBERSHIP_SHARE] = -1
+
+    day_of_year = (departure - np.datetime64(f'{year}-01-01')).astype('timedelta64[D]').astype(np.int64)
+    temperature = 11 - 8 * np.cos(2 * np.pi * (day_of_year - 15) / 365) + rng.normal(0, 3, rows)
+
+    stopovers = rng.choice(len(STOPOVER_SHARES), rows, p=STOPOVER_SHARES).astype(np.int8)
+    stopover_duration = (stopovers * rng.exponential(600, rows)).astype(np.int32)
+
+    weekday = (day_of_year + pd.Timestamp(year, 1, 1).weekday()) % 7
+    df = pd.DataFrame({
+        'Departure': departure.astype('datetime64[ns]'),
+        'Return': returned,
+        'Electric bike': rng.random(rows) < ELECTRIC_SHARE,
+        'Departure station': pd.Categorical.from_codes(
+            rng.choice(len(stations), rows, p=station_weights), dtype=station_dtype
+        ),
+        'Return station': pd.Categorical.from_codes(
+            rng.choice(len(stations), rows, p=station_weights), dtype=station_dtype
+        ),
+        'Membership type': pd.Categorical.from_codes(membership_codes, categories=memberships),
+        'Covered distance (m)': distance,
+        'Duration (sec.)': duration,
+        'Departure temperature (C)': temperature.astype(np.float32),
+        'Return temperature (C)': (temperature + rng.normal(0, 0.5, rows)).astype(np.float32),
+        'Stopover duration (sec.)': stopover_duration,
+        'Number of stopovers': stopovers,
+        'Month': MONTHS[month - 1],
+        'Season': SEASONS[MONTHS[month - 1]],
+        'Day of Week': pd.Categorical.from_codes(weekday, dtype=TRIP_DTYPES['Day of Week']),
+    })
+    df = df.astype({'Month': TRIP_DTYPES['Month'], 'Season': TRIP_DTYPES['Season']})
+
+    return sort_by_departure(df)
+
+
+def write_dataset(output_dir, rows, years=(2023,), seed=0):
+    """
+    Write a synthetic processed dataset of monthly partitions and a manifest.
+
+    Months are generated and written one at a time, so memory use is bounded
+    by the largest month rather than by ``rows``.
+
+    Args:
+        output_dir (str): Directory to write; use it as ``MOBI_PROCESSED_DIR``.
+        rows (int): Total number of trips.
+        years (list): Years the trips are spread over.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        dict: The manifest partitions that were written.
+    """
+    rng = np.random.default_rng(seed)
+    stations = pd.Index(load_station_coordinates()['Station'])
+
+    partitions = {}
+    for year, month, count in month_rows(rows, list(years)):
+        key = f"{year}-{month:02d}"
+        relative_path = os.path.join('trips', str(year), f"{month:02d}.parquet")
+        df = generate_month(rng, year, month, count, stations)
+        write_parquet(df, os.path.join(output_dir, relative_path))
+
+        departure = df['Departure']
+        partitions[key] = {
+            'source': f"synthetic seed={seed}",
+            'sha256': f"synthetic-{seed}-{rows}-{key}",
+            'path': relative_path,
+            'rows': count,
+            'first_departure': departure.min().isoformat() if count else None,
+            'last_departure': departure.max().isoformat() if count else None,
+        }
+
+    write_manifest(partitions, os.path.join(output_dir, 'manifest.json'))
+    return partitions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic Mobi trips in the processed partition layout.")
+    parser.add_argument('--rows', type=int, required=True, help="total number of trips")
+    parser.add_argument('--output-dir', required=True, help="directory to write (use as MOBI_PROCESSED_DIR)")
+    parser.add_argument('--years', type=int, nargs='+', default=[2023], help="years the trips are spread over")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the random generator")
+    args = parser.parse_args()
+
+    partitions = write_dataset(args.output_dir, args.rows, args.years, args.seed)
+    print(f"Wrote {args.rows} synthetic trips in {len(partitions)} partitions to {args.output_dir}")
+
+
+if __name__ == '__main__':
+    main()
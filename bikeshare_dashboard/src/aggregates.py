@@ -0,0 +1,370 @@
+"""
+Precomputed aggregates that answer dashboard queries without scanning trips.
+"""
+
+import numpy as np
+import pandas as pd
+
+from ingest import SEASONS
+
+
+class DailyAggregates:
+    """
+    Per-day prefix sums over the trip table for the Overview date-range cards.
+
+    Trips are bucketed by departure day on a contiguous calendar. Prefix sums
+    of ride counts, departure temperatures and per-station and per-weekday
+    counts answer any inclusive day range by subtracting two rows, and a
+    sparse table answers the range maximum of covered distance in O(1).
+
+    Args:
+        df (pandas.DataFrame): The trip table in the compact schema.
+    """
+
+    def __init__(self, df):
+        departure = df['Departure'].values
+        valid = ~np.isnat(departure)
+        days = departure[valid].astype('datetime64[D]')
+
+        if len(days):
+            self.first_day = days.min()
+            num_days = int((days.max() - self.first_day).astype(np.int64)) + 1
+        else:
+            self.first_day = np.datetime64('1970-01-01', 'D')
+            num_days = 0
+        self.num_days = num_days
+
+        day_index = (days - self.first_day).astype(np.int64)
+
+        # Ride counts per day
+        counts = np.bincount(day_index, minlength=num_days)
+        self.cum_counts = _prefix_sum(counts)
+
+        # Departure temperature sums and non-null counts per day
+        temperature = df['Departure temperature (C)'].values[valid].astype(np.float64)
+        has_temperature = ~np.isnan(temperature)
+        self.cum_temperature = _prefix_sum(
+            np.bincount(day_index[has_temperature], weights=temperature[has_temperature], minlength=num_days)
+        )
+        self.cum_temperature_counts = _prefix_sum(np.bincount(day_index[has_temperature], minlength=num_days))
+
+        # Sparse table of the maximum covered distance per day
+        distance = df['Covered distance (m)'].values[valid].astype(np.float64)
+        daily_max_distance = np.full(num_days, np.nan)
+        np.fmax.at(daily_max_distance, day_index, distance)
+        self.max_distance_table = _sparse_table(daily_max_distance)
+
+        # Departure counts per day and station
+        stations = df['Departure station'].cat
+        self.stations = np.asarray(stations.categories, dtype=object)
+        station_codes = stations.codes.values[valid].astype(np.int64)
+        has_station = station_codes >= 0
+        station_counts = np.bincount(
+            day_index[has_station] * len(self.stations) + station_codes[has_station],
+            minlength=num_days * len(self.stations)
+        ).reshape(num_days, len(self.stations))
+        self.cum_station_counts = _prefix_sum(station_counts)
+
+        # Departure counts per day and weekday (Monday is 0)
+        self.weekdays = np.array(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'])
+        calendar_days = self.first_day + np.arange(num_days)
+        weekday_counts = np.zeros((num_days, 7), dtype=np.int64)
+        weekday_counts[np.arange(num_days), pd.DatetimeIndex(calendar_days).dayofweek] = counts
+        self.cum_weekday_counts = _prefix_sum(weekday_counts)
+
+    def day_bounds(self, start_date, end_date):
+        """
+        Convert an inclusive date range into positions on the day axis.
+
+        Args:
+            start_date (str): The first day of the range, e.g. ``'2023-01-01'``.
+            end_date (str): The last day of the range, e.g. ``'2023-12-31'``.
+
+        Returns:
+            tuple: The ``(start, stop)`` day positions, with ``stop`` exclusive.
+        """
+        start = (np.datetime64(pd.Timestamp(start_date).date()) - self.first_day).astype(np.int64)
+        stop = (np.datetime64(pd.Timestamp(end_date).date()) - self.first_day).astype(np.int64) + 1
+        start = int(np.clip(start, 0, self.num_days))
+        stop = int(np.clip(stop, 0, self.num_days))
+
+        return start, max(start, stop)
+
+    def summarize(self, start_date, end_date):
+        """
+        Compute the Overview card metrics for an inclusive date range.
+
+        Args:
+            start_date (str): The first day of the range.
+            end_date (str): The last day of the range.
+
+        Returns:
+            dict: The ride count, average departure temperature, maximum covered
+                distance (m), busiest departure station, busiest weekday and the
+                number of stations with at least one departure.
+                Metrics that are undefined for an empty range are ``None``, except
+                the average temperature which is NaN as with ``Series.mean``.
+        """
+        start, stop = self.day_bounds(start_date, end_date)
+
+        rides_count = int(self.cum_counts[stop] - self.cum_counts[start])
+        temperature_count = self.cum_temperature_counts[stop] - self.cum_temperature_counts[start]
+        temperature_sum = self.cum_temperature[stop] - self.cum_temperature[start]
+        average_temperature = temperature_sum / temperature_count if temperature_count else np.nan
+
+        if rides_count == 0:
+            return {
+                'rides_count': 0,
+                'average_temperature': average_temperature,
+                'max_distance': None,
+                'busiest_station': None,
+                'busiest_day': None,
+                'active_stations': 0,
+            }
+
+        station_counts = self.cum_station_counts[stop] - self.cum_station_counts[start]
+        weekday_counts = self.cum_weekday_counts[stop] - self.cum_weekday_counts[start]
+
+        return {
+            'rides_count': rides_count,
+            'average_temperature': average_temperature,
+            'max_distance': _range_max(self.max_distance_table, start, stop),
+            'busiest_station': self.stations[station_counts.argmax()] if station_counts.any() else None,
+            'busiest_day': self.weekdays[weekday_counts.argmax()],
+            'active_stations': int(np.count_nonzero(station_counts)),
+        }
+
+
+class TripCube:
+    """
+    Trip measures pre-aggregated by bike type, membership type, month and weekday.
+
+    Each cell of the cube holds the trip count, the sum, count, minimum and
+    maximum of covered distance, and the total duration of the trips in it, so
+    any combination of the Trends filters is answered by reducing a few
+    thousand cells instead of filtering trip rows. Trips without a membership
+    type are kept in an extra slot that only the ``'all'`` selection includes.
+
+    Args:
+        df (pandas.DataFrame): The trip table in the compact schema.
+    """
+
+    def __init__(self, df):
+        self.months = list(df['Month'].cat.categories)
+        self.weekdays = list(df['Day of Week'].cat.categories)
+        self.memberships = list(df['Membership type'].cat.categories)
+        self.membership_index = {membership: i for i, membership in enumerate(self.memberships)}
+
+        month_codes = df['Month'].cat.codes.values.astype(np.int64)
+        weekday_codes = df['Day of Week'].cat.codes.values.astype(np.int64)
+        valid = (month_codes >= 0) & (weekday_codes >= 0)
+
+        # Missing membership types go into the extra slot at the end
+        membership_codes = df['Membership type'].cat.codes.values.astype(np.int64)
+        membership_codes = np.where(membership_codes >= 0, membership_codes, len(self.memberships))
+
+        bike_codes = df['Electric bike'].values.astype(np.int64)
+
+        self.shape = (2, len(self.memberships) + 1, len(self.months), len(self.weekdays))
+        cells = np.ravel_multi_index(
+            (bike_codes[valid], membership_codes[valid], month_codes[valid], weekday_codes[valid]),
+            self.shape
+        )
+        size = int(np.prod(self.shape))
+
+        distance = df['Covered distance (m)'].values[valid].astype(np.float64)
+        duration = df['Duration (sec.)'].values[valid].astype(np.float64)
+        has_distance = ~np.isnan(distance)
+        has_duration = ~np.isnan(duration)
+
+        self.count = np.bincount(cells, minlength=size).reshape(self.shape)
+        self.distance_sum = np.bincount(
+            cells[has_distance], weights=distance[has_distance], minlength=size
+        ).reshape(self.shape)
+        self.distance_count = np.bincount(cells[has_distance], minlength=size).reshape(self.shape)
+        self.duration_sum = np.bincount(
+            cells[has_duration], weights=duration[has_duration], minlength=size
+        ).reshape(self.shape)
+
+        self.distance_min = np.full(size, np.nan)
+        self.distance_max = np.full(size, np.nan)
+        np.fmin.at(self.distance_min, cells, distance)
+        np.fmax.at(self.distance_max, cells, distance)
+        self.distance_min = self.distance_min.reshape(self.shape)
+        self.distance_max = self.distance_max.reshape(self.shape)
+
+    def _selection(self, selected_bike, selected_membership, selected_months):
+        """Index arrays for the cube cells matching the Trends filters."""
+        if selected_bike == 'electric':
+            bikes = [1]
+        elif selected_bike == 'classic':
+            bikes = [0]
+        else:
+            bikes = [0, 1]
+
+        if 'all' in selected_membership:
+            memberships = list(range(self.shape[1]))
+        else:
+            memberships = sorted(
+                self.membership_index[m] for m in set(selected_membership) if m in self.membership_index
+            )
+
+        months = [i for i, month in enumerate(self.months) if month in selected_months]
+
+        axes = (bikes, memberships, months, range(self.shape[3]))
+        return np.ix_(*(np.asarray(axis, dtype=np.intp) for axis in axes)), months
+
+    def monthly(self, selected_bike, selected_membership, selected_months):
+        """
+        Aggregate the selected trips by month.
+
+        Args:
+            selected_bike (str): Selected bike type ('electric', 'classic', or 'both').
+            selected_membership (list): Selected membership types, or ``['all']``.
+            selected_months (list): Abbreviated names of the selected months.
+
+        Returns:
+            pandas.DataFrame: One row per month with trips, in calendar order, with
+                the month, its season, the trip count, the total, average, minimum
+                and maximum covered distance (m) and the total duration (sec.).
+        """
+        index, months = self._selection(selected_bike, selected_membership, selected_months)
+        axes = (0, 1, 3)
+
+        count = self.count[index].sum(axis=axes)
+        distance_sum = self.distance_sum[index].sum(axis=axes)
+        distance_count = self.distance_count[index].sum(axis=axes)
+        duration_sum = self.duration_sum[index].sum(axis=axes)
+        distance_min = _reduce_months(np.fmin, self.distance_min[index])
+        distance_max = _reduce_months(np.fmax, self.distance_max[index])
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            distance_mean = distance_sum / distance_count
+
+        month_names = [self.months[i] for i in months]
+        monthly = pd.DataFrame({
+            'Month': month_names,
+            'Season': [SEASONS[month] for month in month_names],
+            'Bike Count': count,
+            'Total Covered Distance (m)': distance_sum,
+            'Average Covered Distance (m)': distance_mean,
+            'Minimum Covered Distance (m)': distance_min,
+            'Maximum Covered Distance (m)': distance_max,
+            'Duration (sec.)': duration_sum,
+        })
+
+        return monthly[monthly['Bike Count'] > 0].reset_index(drop=True)
+
+    def weekday_counts(self, selected_bike, selected_membership, selected_months):
+        """
+        Count the selected trips by day of the week.
+
+        Args:
+            selected_bike (str): Selected bike type ('electric', 'classic', or 'both').
+            selected_membership (list): Selected membership types, or ``['all']``.
+            selected_months (list): Abbreviated names of the selected months.
+
+        Returns:
+            pandas.Series: Trip counts indexed by weekday name, Monday first.
+        """
+        index, _ = self._selection(selected_bike, selected_membership, selected_months)
+
+        return pd.Series(self.count[index].sum(axis=(0, 1, 2)), index=self.weekdays)
+
+
+class StationActivity:
+    """
+    Departures plus returns per station, month and bike type, as a dense matrix.
+
+    Rows follow the station codes of the trip table (both station columns share
+    their categories), so ranking stations for the map over a month range is a
+    slice, a sum and an ``argpartition``.
+
+    Args:
+        df (pandas.DataFrame): The trip table in the compact schema.
+        located (numpy.ndarray): Boolean mask over station codes of the stations
+            that can be placed on the map; other stations are never ranked.
+    """
+
+    def __init__(self, df, located=None):
+        self.stations = df['Departure station'].cat.categories
+        self.months = list(df['Month'].cat.categories)
+        self.located = np.ones(len(self.stations), dtype=bool) if located is None else np.asarray(located, dtype=bool)
+
+        self.counts = np.zeros((len(self.stations), len(self.months), 2), dtype=np.int64)
+        month_codes = df['Month'].cat.codes.values.astype(np.int64)
+        bike_codes = df['Electric bike'].values.astype(np.int64)
+
+        for column in ['Departure station', 'Return station']:
+            station_codes = df[column].cat.codes.values.astype(np.int64)
+            valid = (station_codes >= 0) & (month_codes >= 0)
+            cells = np.ravel_multi_index(
+                (station_codes[valid], month_codes[valid], bike_codes[valid]), self.counts.shape
+            )
+            self.counts += np.bincount(cells, minlength=self.counts.size).reshape(self.counts.shape)
+
+    def top_stations(self, start_month, end_month, bike_type, limit=None):
+        """
+        Rank the stations by activity over a range of months.
+
+        Args:
+            start_month (int): Index of the first month (0 is January).
+            end_month (int): Index of the last month, inclusive.
+            bike_type (str): The bike type ('electric', 'classic', or 'both').
+            limit (int): Number of stations to keep, or ``None`` for every active station.
+
+        Returns:
+            tuple: Codes of the active stations, busiest first, and their
+                activity counts.
+        """
+        if bike_type == 'electric':
+            bikes = [1]
+        elif bike_type == 'classic':
+            bikes = [0]
+        else:
+            bikes = [0, 1]
+
+        totals = self.counts[:, start_month:end_month + 1, bikes].sum(axis=(1, 2))
+        rows = np.flatnonzero(totals * self.located)
+
+        if limit is not None and limit < len(rows):
+            rows = rows[np.argpartition(-totals[rows], limit - 1)[:limit]]
+
+        # Busiest first, ties in station order
+        rows = rows[np.lexsort((rows, -totals[rows]))]
+
+        return rows, totals[rows]
+
+
+def _prefix_sum(values):
+    """Cumulative sum along the first axis with a leading row of zeros."""
+    values = np.asarray(values)
+    prefix = np.zeros((len(values) + 1,) + values.shape[1:], dtype=np.result_type(values.dtype, np.int64))
+    np.cumsum(values, axis=0, out=prefix[1:])
+    return prefix
+
+
+def _sparse_table(values):
+    """Build a sparse table where level k holds the max of each 2**k window."""
+    table = [values]
+    width = 1
+    while 2 * width <= len(values):
+        previous = table[-1]
+        table.append(np.fmax(previous[:-width], previous[width:]))
+        width *= 2
+    return table
+
+
+def _range_max(table, start, stop):
+    """Maximum of the values in positions [start, stop) using a sparse table."""
+    level = int(np.log2(stop - start))
+    width = 1 << level
+    return np.fmax(table[level][start], table[level][stop - width])
+
+
+def _reduce_months(ufunc, values):
+    """Reduce a cube selection to one value per month with a NaN-ignoring ufunc."""
+    num_months = values.shape[2]
+    if values.size == 0:
+        return np.full(num_months, np.nan)
+    return ufunc.reduce(np.moveaxis(values, 2, 0).reshape(num_months, -1), axis=1)
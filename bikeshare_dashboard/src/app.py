@@ -1,21 +1,40 @@
-from dash import dash, dash_table, callback, html, dcc, Input, Output
+import os
+import import_timer
+
+# Optionally log the slowest imports once the app has loaded (e.g. IMPORT_TIME_REPORT=1)
+if os.environ.get('IMPORT_TIME_REPORT'):
+    import_timer.install()
+
+from dash import dash, ctx, html, dcc, Input, Output, State, DiskcacheManager, no_update
+from dash.exceptions import PreventUpdate
+from flask import Response, abort, request, send_file
 import dash_bootstrap_components as dbc
-import dash_mantine_components as dmc
+import diskcache
 import pandas as pd
 import numpy as np
-import altair as alt
-import os
+import logging
 import plotly.graph_objects as go
 import plotly.express as px
-import altair as alt
-from datetime import date
-import calendar
-import tempfile
-import zipfile
-import folium
-from folium.plugins import HeatMap
+import hashlib
+import threading
+from urllib.parse import urlencode
+from plotly.io.json import to_json_plotly
+from cache import LRUCache, memoize
+from export import EXPORT_FORMATS, stream_csv, stream_parquet
+from ingest import (
+    MONTHS, PROCESSED_DIR, SEASON_MONTHS, SEASON_NAMES, align_stations, data_version, load_station_coordinates,
+    read_export_metadata, write_export
+)
+from metrics import CallbackMetrics, JobMetrics, instrument_callbacks, instrument_routes, render_cache_stats
+from permalinks import MEMBERSHIP_TYPES, VisitLog, canonical_permalink, map_permalink, parse_permalink, trends_permalink
+from queries import filter_trips, select_date_range
+from shared_cache import SharedCache, SQLiteBackend, shared_cache_from_url
+from snapshot import (
+    build_aggregates, code_version, load_snapshot, read_warm_state, snapshot_path, warm_state_lock, write_warm_state
+)
+
 
-alt.data_transformers.disable_max_rows()
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s: %(message)s')
 
 # Setup app and layout/frontend
 app = dash.Dash(
@@ -86,9 +105,140 @@ header = html.Div(
     style={"align": "center", "margin-left": 15}
 )
 
-combined_df = pd.read_csv('../data/processed/mobi_data.csv')
+# Map the trips with a departure and return station and their aggregates from
+# the snapshot shared by all workers (built from data/raw by ingest.py on first
+# use), sorted by departure time so date ranges can be selected by binary search.
+# DATA_START_DATE / DATA_END_DATE restrict the dashboard to a window of the
+# history, read from just the partitions covering it, in which case the
+# aggregates are built for that window.
+data_window = (os.environ.get('DATA_START_DATE'), os.environ.get('DATA_END_DATE'))
+combined_df, shared_aggregates = load_snapshot(start_date=data_window[0], end_date=data_window[1])
+
+# First and last day with trips, which bound the calendar
+first_day = combined_df['Departure'].min().date()
+last_day = combined_df['Departure'].max().date()
+
+# Identifies this build of the data in URLs and cache validators
+DATA_VERSION = data_version()
+
+# The first page's placeholders and default views, computed once per data and
+# code version into the snapshot (see build_warm_state). A DATA_START_DATE /
+# DATA_END_DATE window has no warm state, as the snapshot covers all the data.
+CODE_VERSION = code_version()
+warm_state_dir = snapshot_path() if data_window == (None, None) else None
+warm_state = read_warm_state(warm_state_dir, CODE_VERSION) if warm_state_dir else None
+
+# Version of the cached callback results and rendered maps. It changes with
+# the data and with the code computing them, so results cached before a
+# deploy, in the shared cache or map store, are not served after it.
+RESULT_VERSION = f"{DATA_VERSION}-{CODE_VERSION}"
+
+# Memoized callback results by name, reported on /metrics
+result_caches = {}
+
+# Optionally share callback results and rendered maps between workers, e.g.
+# SHARED_CACHE_URL=sqlite:////tmp/cyclesync-cache.db or redis://localhost:6379/0
+shared_cache = shared_cache_from_url(
+    os.environ.get('SHARED_CACHE_URL'),
+    max_bytes=int(os.environ.get('SHARED_CACHE_MAX_BYTES', 256 * 1024 * 1024)),
+    ttl=int(os.environ['SHARED_CACHE_TTL']) if os.environ.get('SHARED_CACHE_TTL') else None,
+    lock_seconds=float(os.environ.get('SHARED_CACHE_LOCK_SECONDS', 30))
+)
+
+
+# The map and the raw-data zip are built by background callbacks, in job
+# processes started by the worker. Their progress and results are kept on disk
+# in JOBS_DIR, so whichever worker the browser polls can answer, and a job is
+# terminated when the user cancels it or changes the inputs while it runs.
+JOBS_DIR = os.environ.get('JOBS_DIR', os.path.join(PROCESSED_DIR, 'jobs'))
+background_manager = DiskcacheManager(diskcache.Cache(os.path.join(JOBS_DIR, 'callbacks')))
+
+# Calls slower than SLOW_CALLBACK_SECONDS are logged with their inputs
+slow_callback_seconds = float(os.environ['SLOW_CALLBACK_SECONDS']) if os.environ.get('SLOW_CALLBACK_SECONDS') else None
+
+# The work done in the jobs is timed there, as the callback metrics of the
+# worker only see the job being dispatched and polled, and is kept on disk,
+# shared by every worker's jobs
+job_metrics = JobMetrics(os.path.join(JOBS_DIR, 'metrics'), slow_seconds=slow_callback_seconds)
+
+# Visits of each Trends and Map permalink, shared by the workers, so the most
+# visited (PRERENDER_PERMALINKS, default 20) are pre-rendered into the warm state
+visit_log = VisitLog(os.path.join(JOBS_DIR, 'permalinks.db'))
+
+
+def memoized(name, key, sizeof=None, share=False):
+    """
+    Memoize a function in a bounded cache of its own, dropped when the data or code changes.
+
+    Each cache holds at most CALLBACK_CACHE_MAX_ENTRIES results and
+    CALLBACK_CACHE_MAX_BYTES of them, least recently used first out, and
+    CALLBACK_CACHE_TTL optionally expires results after that many seconds.
+
+    Args:
+        name (str): Name of the cache in the metrics.
+        key (callable): Maps the function's arguments to a canonical key.
+        sizeof (callable): Estimates the size of a result in bytes.
+        share (bool): Also keep the results in the shared cache, if configured.
+
+    Returns:
+        callable: The decorator.
+    """
+    cache = LRUCache(
+        max_entries=int(os.environ.get('CALLBACK_CACHE_MAX_ENTRIES', 256)),
+        max_bytes=int(os.environ.get('CALLBACK_CACHE_MAX_BYTES', 16 * 1024 * 1024)),
+        sizeof=sizeof,
+        ttl=float(os.environ['CALLBACK_CACHE_TTL']) if os.environ.get('CALLBACK_CACHE_TTL') else None
+    )
+    result_caches[name] = cache
+    return memoize(cache, key=key, version=lambda: RESULT_VERSION, shared=shared_cache if share else None)
+
+
+def response_size(result):
+    """Size in bytes of a callback result once serialised for the browser."""
+    return len(to_json_plotly(result))
+
+
+def date_key(date):
+    """Normalise a calendar date, with or without a time, to the day it selects."""
+    return pd.Timestamp(date).date().isoformat() if date else date
+
+
+def overview_key(start_date, end_date):
+    """Cache key of the Overview callbacks."""
+    return date_key(start_date), date_key(end_date)
+
+
+def trends_key(selected_bike, selected_membership, selected_season):
+    """
+    Cache key of the Trends filters: membership order and duplicates are
+    ignored and the season slider values are made integers.
+    """
+    return selected_bike, tuple(sorted(set(selected_membership))), tuple(int(season) for season in selected_season)
+
+
+def trends_view_key(selected_bike, selected_membership, selected_view, selected_season):
+    """Cache key of the Trends callback: the filters' key and the selected view."""
+    return trends_key(selected_bike, selected_membership, selected_season) + (selected_view,)
+
+# Load the station coordinates, parsed into float lat/lon columns
+dfc = load_station_coordinates()
+
+
+def observed_counts(column):
+    """
+    Count the values of a categorical column, leaving out categories that never occur.
+
+    Args:
+        column (pandas.Series): A categorical column of combined_df.
+
+    Returns:
+        pandas.Series: Counts in descending order, indexed by plain string labels.
+    """
+    counts = column.value_counts()
+    counts = counts[counts > 0]
+    counts.index = counts.index.astype(str)
+    return counts
 
-dfc = pd.read_csv('../data/coordinates/station_coordinates.csv')
 
 vancouver_geojson = {
     "type": "Feature",
@@ -98,124 +248,146 @@ vancouver_geojson = {
     }
 }
 
-months = sorted(combined_df['Month'].unique().tolist())
-marks = {
-    0: {'label': 'Jan'},
-    1: {'label': 'Feb'},
-    2: {'label': 'Mar'},
-    3: {'label': 'Apr'},
-    4: {'label': 'May'},
-    5: {'label': 'Jun'},
-    6: {'label': 'Jul'},
-    7: {'label': 'Aug'},
-    8: {'label': 'Sep'},
-    9: {'label': 'Oct'},
-    10: {'label': 'Nov'},
-    11: {'label': 'Dec'}
-}
+# Map slider positions are calendar months (0 is January)
+months = MONTHS
+marks = {i: {'label': month} for i, month in enumerate(months)}
 
 # ---------------DATE FILTER--------------------
 date_picker = dcc.DatePickerRange(
     id="calendar",
-    min_date_allowed=date(2023, 1, 1),
-    max_date_allowed=date(2023, 12, 31),
-    start_date=date(2023, 1, 1),
-    end_date=date(2023, 12, 31),
+    min_date_allowed=first_day,
+    max_date_allowed=last_day,
+    start_date=first_day,
+    end_date=last_day,
     start_date_placeholder_text="Start Date",
     end_date_placeholder_text="End Date",
     clearable=False
 )
 
-# ---------------ROW 1-----------------------
+# Per-day aggregates for the date-range cards, the trip cube for the Trends
+# filters and station activity by month and bike type for the map
+if shared_aggregates is None:
+    shared_aggregates = build_aggregates(combined_df, dfc)
+daily_aggregates = shared_aggregates['daily_aggregates']
+trip_cube = shared_aggregates['trip_cube']
+station_activity = shared_aggregates['station_activity']
 
-# Get the count of rides
-rides_count = len(combined_df)
+# Align station coordinates with the station codes of the trips
+station_locations = align_stations(dfc, combined_df['Departure station'].cat.categories)
 
-# Assuming combined_df has been defined and 'Departure Temperature' column is present
-average_departure_temperature = f"{round(combined_df['Departure temperature (C)'].mean(),0)}°C"
 
-# Find the maximum covered distance
-max_covered_distance = combined_df['Covered distance (m)'].max()
+def overview_placeholders(trips):
+    """
+    Compute the Overview values and figures shown before the date-range callbacks first run.
 
-max_covered_distance_kilometers = f"{round((max_covered_distance / 1000 ),0)} km"
+    Args:
+        trips (pandas.DataFrame): The dashboard trip table.
 
-# Remove null records
-combined_df = combined_df.dropna(subset=['Departure station'])
+    Returns:
+        dict: The first row card values, the number of stations, the membership
+            pie chart (``fig2``) and the top return stations bar chart (``fig``).
+    """
+    # ---------------ROW 1-----------------------
 
-# Count occurrences of each station
-station_counts = combined_df['Departure station'].value_counts()
+    # Get the count of rides
+    rides_count = len(trips)
 
-# Get the busiest station
-busiest_station_departure = station_counts.idxmax()
+    # Assuming trips has been defined and 'Departure Temperature' column is present
+    average_departure_temperature = f"{round(trips['Departure temperature (C)'].mean(),0)}°C"
 
-# Convert 'Departure' to datetime
-combined_df['Departure'] = pd.to_datetime(combined_df['Departure'])
+    # Find the maximum covered distance
+    max_covered_distance = trips['Covered distance (m)'].max()
 
-# Extract day of the week
-combined_df['Day of Week'] = combined_df['Departure'].dt.day_name()
+    max_covered_distance_kilometers = f"{round((max_covered_distance / 1000 ),0)} km"
 
-# Count the number of trips for each day of the week
-busiest_day_weekly = combined_df['Day of Week'].value_counts().idxmax()
+    # Count occurrences of each station
+    station_counts = trips['Departure station'].value_counts()
 
-# ---------------PLOT 1-----------------------
+    # Get the busiest station
+    busiest_station_departure = station_counts.idxmax()
 
-# Get the number of unique stations
-num_stations = len(combined_df['Departure station'].unique())
+    # Count the number of trips for each day of the week
+    busiest_day_weekly = trips['Day of Week'].value_counts().idxmax()
 
-# ---------------PLOT 2-----------------------
+    # ---------------PLOT 1-----------------------
 
-counts_series = combined_df['Membership type'].value_counts()
-index_list = counts_series.index.tolist()
-counts_list = counts_series.tolist()
+    # Get the number of unique stations
+    num_stations = len(trips['Departure station'].unique())
 
-labels = index_list[:18]
-labels.append('Others')
-values = counts_list[:18]
-values.append(sum(counts_list[18:]))
+    # ---------------PLOT 2-----------------------
 
-total_count = sum(values)
+    counts_series = observed_counts(trips['Membership type'])
+    index_list = counts_series.index.tolist()
+    counts_list = counts_series.tolist()
 
-fig2 = go.Figure(data=[go.Pie(labels=labels, values=values, hole=0.5, textinfo='none', marker=dict(colors=px.colors.sequential.Reds[::-1]))])
+    labels = index_list[:18]
+    labels.append('Others')
+    values = counts_list[:18]
+    values.append(sum(counts_list[18:]))
 
-fig2.add_annotation(text='Number of Rides<br>' + str(total_count), showarrow=False, font=dict(size=15), x=0.5, y=0.5)
+    total_count = sum(values)
 
-fig2.update_layout(showlegend=False)
+    fig2 = go.Figure(data=[go.Pie(labels=labels, values=values, hole=0.5, textinfo='none', marker=dict(colors=px.colors.sequential.Reds[::-1]))])
 
-# ---------------PLOT 3-----------------------
+    fig2.add_annotation(text='Number of Rides<br>' + str(total_count), showarrow=False, font=dict(size=15), x=0.5, y=0.5)
 
-# Remove null records
-combined_df = combined_df.dropna(subset=['Return station'])
+    fig2.update_layout(showlegend=False)
 
-# Get the top 10 most common end trip stations
-top_end_stations = combined_df['Return station'].value_counts().nlargest(10)
+    # ---------------PLOT 3-----------------------
 
-# Calculate percentages
-percentage_values = (top_end_stations / top_end_stations.sum()) * 100
+    # Get the top 10 most common end trip stations
+    top_end_stations = observed_counts(trips['Return station']).nlargest(10)
 
-# Create a horizontal bar graph using Plotly Express
-fig = px.bar(
-    top_end_stations,
-    orientation='h',
-    labels={'Return Station', 'Count'},
-    color=percentage_values.index,  # Use the stations as the color variable
-    color_discrete_sequence=[
-                    '#8C0000', '#A50000', '#BF0000', '#D80000', '#F20000',
-                    '#FF3333', '#FF6666', '#FF9999', '#FFCCCC', '#FFFFFF'
-                ],
-    text=percentage_values.round(2).astype(str) + '%'  # Display percentages as text on the bars
-)
+    # Calculate percentages
+    percentage_values = (top_end_stations / top_end_stations.sum()) * 100
 
-# Sort bars in descending order
-fig.update_yaxes(categoryorder='total ascending')
+    # Create a horizontal bar graph using Plotly Express
+    fig = px.bar(
+        top_end_stations,
+        orientation='h',
+        labels={'Return Station', 'Count'},
+        color=percentage_values.index,  # Use the stations as the color variable
+        color_discrete_sequence=[
+                        '#8C0000', '#A50000', '#BF0000', '#D80000', '#F20000',
+                        '#FF3333', '#FF6666', '#FF9999', '#FFCCCC', '#FFFFFF'
+                    ],
+        text=percentage_values.round(2).astype(str) + '%'  # Display percentages as text on the bars
+    )
 
-# Remove color legend
-fig.update_layout(showlegend=False)
+    # Sort bars in descending order
+    fig.update_yaxes(categoryorder='total ascending')
 
-# Remove y-axis and x-axis names
-fig.update_layout(
-    xaxis_title='',
-    yaxis_title='',
-)
+    # Remove color legend
+    fig.update_layout(showlegend=False)
+
+    # Remove y-axis and x-axis names
+    fig.update_layout(
+        xaxis_title='',
+        yaxis_title='',
+    )
+
+    return {
+        'rides_count': rides_count,
+        'average_departure_temperature': average_departure_temperature,
+        'max_covered_distance_kilometers': max_covered_distance_kilometers,
+        'busiest_station_departure': busiest_station_departure,
+        'busiest_day_weekly': busiest_day_weekly,
+        'num_stations': num_stations,
+        'fig2': fig2,
+        'fig': fig,
+    }
+
+
+# Load the placeholders from the warm state when it was built for this data and code
+placeholders = warm_state['placeholders'] if warm_state else overview_placeholders(combined_df)
+rides_count = placeholders['rides_count']
+average_departure_temperature = placeholders['average_departure_temperature']
+max_covered_distance_kilometers = placeholders['max_covered_distance_kilometers']
+busiest_station_departure = placeholders['busiest_station_departure']
+busiest_day_weekly = placeholders['busiest_day_weekly']
+num_stations = placeholders['num_stations']
+fig2 = placeholders['fig2']
+fig = placeholders['fig']
 
 
 # --------------------------------------
@@ -354,6 +526,100 @@ mobideo = html.Div([
                 ])
 
 
+def export_url(start_date, end_date, bike_type, memberships, export_format):
+    """
+    Build the URL of the filtered export route for the current dashboard filters.
+
+    Args:
+        start_date (str): The first day of the ``calendar`` range.
+        end_date (str): The last day of the ``calendar`` range.
+        bike_type (str): Selected bike type ('electric', 'classic', or 'both').
+        memberships (list): Selected membership types, or ``['all']``.
+        export_format (str): Either 'csv' or 'parquet'.
+
+    Returns:
+        str: The relative URL streaming the selected trips.
+    """
+    query = urlencode({
+        'start_date': str(start_date)[:10],
+        'end_date': str(end_date)[:10],
+        'bike_type': bike_type,
+        'membership': memberships,
+        'format': export_format,
+    }, doseq=True)
+    return app.get_relative_path(f"/export/trips?{query}")
+
+
+def export_filters_from_args(args):
+    """
+    Read and validate the export filters from the query string of the export route.
+
+    Args:
+        args (werkzeug.datastructures.MultiDict): The request query arguments.
+
+    Returns:
+        tuple: The (start_date, end_date, bike_type, memberships, export_format) filters.
+
+    Raises:
+        ValueError: If a filter is missing or outside the values the dashboard accepts.
+    """
+    start_date = pd.Timestamp(args.get('start_date', ''))
+    end_date = pd.Timestamp(args.get('end_date', ''))
+    bike_type = args.get('bike_type', 'both')
+    memberships = args.getlist('membership') or ['all']
+    export_format = args.get('format', 'csv')
+
+    if pd.isna(start_date) or pd.isna(end_date) or start_date > end_date:
+        raise ValueError(f"Invalid date range {start_date} - {end_date}")
+    if bike_type not in ('electric', 'classic', 'both'):
+        raise ValueError(f"Invalid bike type {bike_type!r}")
+    if not all(membership in MEMBERSHIP_TYPES for membership in memberships):
+        raise ValueError(f"Invalid membership types {memberships!r}")
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Invalid export format {export_format!r}")
+
+    return start_date.date().isoformat(), end_date.date().isoformat(), bike_type, memberships, export_format
+
+
+@server.route('/export/trips')
+def export_trips():
+    """
+    Stream the trips matching the dashboard filters as CSV or Parquet.
+
+    Rows are serialised in chunks as the response is sent, so exporting a
+    short date range only encodes the trips in that range.
+    """
+    try:
+        start_date, end_date, bike_type, memberships, export_format = export_filters_from_args(request.args)
+    except ValueError:
+        abort(400)
+
+    selected = filter_trips(combined_df, start_date, end_date, bike_type, memberships)
+    stream = stream_csv if export_format == 'csv' else stream_parquet
+    export = EXPORT_FORMATS[export_format]
+
+    response = Response(stream(selected), mimetype=export['mimetype'])
+    response.headers['Content-Disposition'] = (
+        f'attachment; filename="CycleSync Bikeshare {start_date} to {end_date}.{export["extension"]}"'
+    )
+    return response
+
+
+@app.callback(
+    Output('export-link', 'href'),
+    [Input('calendar', 'start_date'),
+     Input('calendar', 'end_date'),
+     Input('table_filter_2', 'value'),
+     Input('table_filter_1', 'value'),
+     Input('export-format', 'value')]
+)
+def update_export_link(start_date, end_date, bike_type, memberships, export_format):
+    """
+    Point the filtered export link at the current calendar, bike and membership filters.
+    """
+    return export_url(start_date, end_date, bike_type, memberships, export_format)
+
+
 dashboard_layout = html.Div(
     [
         dcc.Location(id='dashboard-url', refresh=False),
@@ -373,13 +639,34 @@ dashboard_layout = html.Div(
                         dbc.Col(
                             [html.H6("Date Range:"), date_picker]
                         ),
-                        dbc.Col(width=7),
+                        dbc.Col(width=3),
                         dbc.Col(
                             [
-                                html.Button("Download Raw Data", id="btn-download", className="btn-primary", style={'width': '180px'})
+                                html.Button("Download Raw Data", id="btn-download", className="btn-primary", style={'width': '180px'}),
+                                dbc.Progress(id='download-progress', striped=True, animated=True, style={'display': 'none'}),
+                                html.Button("Cancel", id="btn-download-cancel", style={'display': 'none'}),
+                                dcc.Location(id='download-location', refresh=True)
+                            ]
+                        ),
+                        dbc.Col(
+                            [
+                                html.A(
+                                    html.Button("Download Filtered Data", id="btn-export", className="btn-primary", style={'width': '200px'}),
+                                    id="export-link",
+                                    href=export_url(first_day, last_day, 'both', ['all'], 'csv')
+                                ),
+                                dcc.Dropdown(
+                                    id='export-format',
+                                    options=[
+                                        {'label': 'CSV', 'value': 'csv'},
+                                        {'label': 'Parquet', 'value': 'parquet'}
+                                    ],
+                                    value='csv',
+                                    clearable=False,
+                                    style={'width': '200px', 'margin-top': '5px'}
+                                )
                             ]
                         ),
-                        dcc.Download(id="download-dataframes-zip"),
                     ],
                     style={'margin-bottom': '40px', 'padding-left': '60px'}           
                 ),
@@ -419,6 +706,32 @@ dashboard_layout = html.Div(
     ]
 )
 
+@memoized('overview_summary', overview_key)
+def overview_summary(start_date, end_date):
+    """
+    Compute everything the Overview tab shows for a date range, once per range.
+
+    The three callbacks driven by the calendar share this result, so a single
+    date change selects the trips and counts them only once. The result is
+    cached and must not be modified by callers.
+
+    Args:
+        start_date (str): The start date of the selected date range.
+        end_date (str): The end date of the selected date range.
+
+    Returns:
+        dict: The per-day aggregate metrics from ``DailyAggregates.summarize``,
+            plus the top 10 return station counts and the membership type counts.
+    """
+    summary = daily_aggregates.summarize(start_date, end_date)
+
+    # Select the trips in the range for the counts not covered by the aggregates
+    filtered_df = select_date_range(combined_df, start_date, end_date)
+    summary['top_end_stations'] = observed_counts(filtered_df['Return station']).nlargest(10)
+    summary['membership_counts'] = observed_counts(filtered_df['Membership type'])
+
+    return summary
+
 # Set up callbacks/backend
 @app.callback(
      Output('first-row-cards', 'children'),
@@ -430,6 +743,7 @@ dashboard_layout = html.Div(
      Input('calendar', 'end_date')]
 )
 
+@memoized('update_first_row_cards', overview_key, response_size, share=True)
 def update_first_row_cards(start_date, end_date):
     """
     Update the metrics displayed in the first row of cards based on the selected date range.
@@ -447,34 +761,31 @@ def update_first_row_cards(start_date, end_date):
             - Busiest day of the week
     """
     
-    # Filter data based on selected date range
-    # filtered_df = combined_df[(combined_df['Departure'] >= start_date) & (combined_df['Departure'] <= end_date)]
-    filtered_df = combined_df[(combined_df['Departure'].notnull()) & (combined_df['Departure'] >= start_date) & (combined_df['Departure'] <= end_date)]
+    # Look up the metrics for the selected date range
+    summary = overview_summary(start_date, end_date)
 
     # Update metrics
-    rides_count = len(filtered_df)
-    average_departure_temperature = f"{round(filtered_df['Departure temperature (C)'].mean(),0)}°C"
-    
-    # Check if there are records in the filtered DataFrame before calculating the maximum covered distance
-    if not filtered_df.empty:
-        max_covered_distance = filtered_df['Covered distance (m)'].max()
-        max_covered_distance_kilometers = f"{round((max_covered_distance / 1000), 0)} km"
+    rides_count = summary['rides_count']
+    average_departure_temperature = f"{round(summary['average_temperature'],0)}°C"
+
+    # Check if there are records in the selected range before reporting the maximum covered distance
+    if summary['max_distance'] is not None:
+        max_covered_distance_kilometers = f"{round((summary['max_distance'] / 1000), 0)} km"
     else:
         max_covered_distance_kilometers = "No data available"
 
-    # Check if there are records in the filtered DataFrame before calculating the busiest station
-    if not filtered_df.empty:
-        station_counts = filtered_df['Departure station'].value_counts()
-        busiest_station_departure = station_counts.idxmax()
+    # Check if there are records in the selected range before reporting the busiest station
+    if summary['busiest_station'] is not None:
+        busiest_station_departure = summary['busiest_station']
     else:
-        busiest_station_departure = "No data available"  
+        busiest_station_departure = "No data available"
 
-    # Check if there are records in the filtered DataFrame before calculating the busiest day
-    if not filtered_df.empty and not filtered_df['Day of Week'].empty:
-        busiest_day_weekly = filtered_df['Day of Week'].value_counts().idxmax()
+    # Check if there are records in the selected range before reporting the busiest day
+    if summary['busiest_day'] is not None:
+        busiest_day_weekly = summary['busiest_day']
     else:
-        busiest_day_weekly = "No data available"  
-    
+        busiest_day_weekly = "No data available"
+
     return (
         generate_card("No. of rides", f"{rides_count}", "fas fa-bicycle", id="rides-count"),
         generate_card("Average temperature", f"{average_departure_temperature}", "fas fa-hourglass", id="average-temperature"),
@@ -490,6 +801,7 @@ def update_first_row_cards(start_date, end_date):
      Input('calendar', 'end_date')]
 )
 
+@memoized('update_first_col_cards', overview_key, response_size, share=True)
 def update_first_col_cards(start_date, end_date):
     """
     Update the metrics displayed in the first column of cards based on the selected date range.
@@ -504,13 +816,13 @@ def update_first_col_cards(start_date, end_date):
             - Top 10 most common bike stations based on end trips
     """
     
-    # Filter data based on selected date range
-    filtered_df = combined_df[(combined_df['Departure'].notnull()) & (combined_df['Departure'] >= start_date) & (combined_df['Departure'] <= end_date)]
+    # Look up the metrics for the selected date range
+    summary = overview_summary(start_date, end_date)
 
-    num_stations = len(filtered_df['Departure station'].unique())
+    num_stations = summary['active_stations']
 
     # Get the top 10 most common end trip stations
-    top_end_stations = filtered_df['Return station'].value_counts().nlargest(10)
+    top_end_stations = summary['top_end_stations']
     
     # Calculate percentages
     percentage_values = (top_end_stations / top_end_stations.sum()) * 100
@@ -601,6 +913,7 @@ def update_first_col_cards(start_date, end_date):
       Input('calendar', 'end_date')]
 )
 
+@memoized('update_second_col_cards', overview_key, response_size, share=True)
 def update_second_col_cards(start_date, end_date):
     """
     Update the metrics displayed in the second column of cards based on the selected date range.
@@ -615,10 +928,8 @@ def update_second_col_cards(start_date, end_date):
             - Mobideo: A video embed from YouTube demonstrating a feature related to bike rides.
     """
     
-    # Filter data based on selected date range
-    filtered_df = combined_df[(combined_df['Departure'].notnull()) & (combined_df['Departure'] >= start_date) & (combined_df['Departure'] <= end_date)]
-
-    counts_series = filtered_df['Membership type'].value_counts()
+    # Look up the metrics for the selected date range
+    counts_series = overview_summary(start_date, end_date)['membership_counts']
     index_list = counts_series.index.tolist()
     counts_list = counts_series.tolist()
 
@@ -685,34 +996,87 @@ def update_second_col_cards(start_date, end_date):
 
     return [mobideo, space_div, pie_chart_card]
 
+# Guards building the export so concurrent requests in a worker build it once
+export_lock = threading.Lock()
+
+
+def export_zip(set_progress=None):
+    """
+    Get the "Download Raw Data" zip for the loaded data, building it if needed.
+
+    The zip is normally written by ingest.py; if it is missing or was built
+    from another data version, it is written once from the loaded trips and
+    reused by every later download.
+
+    Args:
+        set_progress (callable): Receives the ``(percent, label)`` progress of
+            a build, as the progress outputs of a background callback.
+
+    Returns:
+        dict: The export metadata (``path``, ``data_version``, ``sha256`` and ``size``).
+    """
+    with export_lock:
+        metadata = read_export_metadata()
+        if metadata is None or metadata['data_version'] != DATA_VERSION:
+            progress = None
+            if set_progress is not None:
+                progress = lambda fraction: set_progress((round(fraction * 100), f"Building zip {fraction:.0%}"))
+            metadata = write_export(combined_df, dfc, DATA_VERSION, progress=progress)
+    return metadata
+
+
+# Builds the zip in the download job, timed as a job step for /metrics
+job_export_zip = job_metrics.instrument(
+    'export_zip', export_zip, sizeof=lambda metadata: metadata['size'], describe_inputs=lambda: ()
+)
+
+
 @app.callback(
-    Output("download-dataframes-zip", "data"),
-    Input("btn-download", "n_clicks"),
-    prevent_initial_call=True,
+    Output('download-location', 'href'),
+    Input('btn-download', 'n_clicks'),
+    background=True,
+    manager=background_manager,
+    running=[
+        (Output('btn-download', 'disabled'), True, False),
+        (Output('download-progress', 'style'), {'margin-top': '5px'}, {'display': 'none'}),
+        (Output('btn-download-cancel', 'style'), {'margin-top': '5px'}, {'display': 'none'}),
+    ],
+    cancel=[Input('btn-download-cancel', 'n_clicks')],
+    progress=[Output('download-progress', 'value'), Output('download-progress', 'label')],
+    progress_default=[0, ""],
+    prevent_initial_call=True
 )
-def download_zip(n_clicks):
-    with tempfile.TemporaryDirectory() as temp_dir:
-        columns_to_remove = ['Month', 'Season', 'Day of Week']
-        df1 = combined_df.drop(columns=columns_to_remove)
-        # Save ride data as CSV
-        df1_path = os.path.join(temp_dir, "Ride Data.csv")
-        df1.to_csv(df1_path, index=False)
-        
-        # Save station coordinates as CSV
-        df2_path = os.path.join(temp_dir, "Station Coordinates.csv")
-        dfc.to_csv(df2_path, index=False)
-        
-        # Create a zip file containing both CSVs
-        zip_path = os.path.join(temp_dir, "CycleSync Bikeshare.zip")
-        with zipfile.ZipFile(zip_path, "w") as zip_file:
-            zip_file.write(df1_path, "Ride Data.csv")
-            zip_file.write(df2_path, "Station Coordinates.csv")
-        
-        # Read the zip file as bytes
-        with open(zip_path, "rb") as f:
-            zip_data = f.read()
-    
-    return dcc.send_bytes(zip_data, filename="CycleSync Bikeshare.zip")
+
+def prepare_download(set_progress, n_clicks):
+    """
+    Build the "Download Raw Data" zip in a background job if it is stale, then
+    send the browser to the route serving it.
+
+    Args:
+        set_progress (callable): Updates the download progress bar.
+        n_clicks (int): Number of clicks on the download button.
+
+    Returns:
+        str: The URL of the zip; the click count makes every click a new URL.
+    """
+    job_export_zip(set_progress)
+    return app.get_relative_path(f"/download/raw-data?{urlencode({'click': n_clicks})}")
+
+
+@server.route('/download/raw-data')
+def download_zip():
+    """
+    Stream the ride data and station coordinates zip from disk.
+    """
+    metadata = export_zip()
+    return send_file(
+        metadata['path'],
+        mimetype='application/zip',
+        as_attachment=True,
+        download_name="CycleSync Bikeshare.zip",
+        etag=metadata['sha256'],
+        conditional=True
+    )
 
 
 # Tab 2
@@ -721,29 +1085,8 @@ def download_zip(n_clicks):
 sort_table_2 = dcc.Dropdown(
     id='table_filter_1',
     options=[
-        {'label': 'All', 'value': 'all'},
-        {'label': '24 Hour', 'value': '24 Hour'},
-        {'label': '30 Day Pass', 'value': '30 Day Pass'},
-        {'label': '365 Corporate Plus', 'value': '365 Corporate Plus'},
-        {'label': '365 Corporate Plus Renewal', 'value': '365 Corporate Plus Renewal'},
-        {'label': '365 Corporate Standard', 'value': '365 Corporate Standard'},
-        {'label': '365 Corporate Standard Renewal', 'value': '365 Corporate Standard Renewal'},
-        {'label': '365 Day Founding Plus', 'value': '365 Day Founding Plus'},
-        {'label': '365 Day Founding Standard', 'value': '365 Day Founding Standard'},
-        {'label': '365 Day Pass Plus', 'value': '365 Day Pass Plus'},
-        {'label': '365 Day Pass Plus SALE', 'value': '365 Day Pass Plus SALE'},
-        {'label': '365 Day Pass Standard', 'value': '365 Day Pass Standard'},
-        {'label': '365 Day Pass Standard SALE', 'value': '365 Day Pass Standard SALE'},
-        {'label': 'Archived Monthly Plus', 'value': 'Archived Monthly Plus'},
-        {'label': 'Archived Monthly Standard', 'value': 'Archived Monthly Standard'},
-        {'label': 'Community Pass', 'value': 'Community Pass'},
-        {'label': 'Community Pass E-bike', 'value': 'Community Pass E-bike'},
-        {'label': 'Community Pass E-bike (PWD)', 'value': 'Community Pass E-bike (PWD)'},
-        {'label': 'Herbaland Pass', 'value': 'Herbaland Pass'},
-        {'label': 'Limited Classic Bikes Only (60 min)', 'value': 'Limited Classic Bikes Only (60 min)'},
-        {'label': 'Pay Per Ride', 'value': 'Pay Per Ride'},
-        {'label': 'UBC Inclusive Corporate Pass', 'value': 'UBC Inclusive Corporate Pass'},
-        {'label': 'VIP', 'value': 'VIP'}
+        {'label': 'All' if membership == 'all' else membership, 'value': membership}
+        for membership in MEMBERSHIP_TYPES
 ],
    value=['all'],
    multi=True,
@@ -763,7 +1106,7 @@ sort_table_1 = dcc.Dropdown(
 
 slider = dcc.RangeSlider(
     id='season_range_slider',
-    marks={0: 'Winter', 1: 'Spring', 2: 'Summer', 3: 'Fall'},
+    marks=dict(enumerate(SEASON_NAMES)),
     min=0,
     max=3,
     step=1,
@@ -957,23 +1300,44 @@ trends_layout = html.Div(
 )
 
 
-# Callback function to update summary card statistics based on the selected view type
-@app.callback(
-    [Output('total-trips', 'children'),
-     Output('average-trips', 'children'),
-     Output('min-trips', 'children'),
-     Output('max-trips', 'children'),
-     Output('total-covered-distance', 'children'),
-     Output('average-covered-distance', 'children'),
-     Output('min-covered-distance', 'children'),
-     Output('max-distance', 'children'),
-     Output('covered_distance_card', 'style'),
-     Output('departure_count_card', 'style')],
-    [Input('table_filter_2', 'value'),
-     Input('table_filter_1', 'value'),
-     Input('table_filter_3', 'value'),
-     Input('season_range_slider', 'value')]  
-)
+def season_months(selected_season):
+    """
+    List the months covered by a range of seasons on the season slider.
+
+    Args:
+        selected_season (list): Start and end season indices (0 is Winter, 3 is Fall).
+
+    Returns:
+        list: Abbreviated names of the months in the selected seasons.
+    """
+    start_season, end_season = selected_season
+
+    # Seasons run Dec-Feb, Mar-May, Jun-Aug and Sep-Nov
+    return SEASON_MONTHS[start_season * 3:(end_season + 1) * 3]
+
+
+@memoized('trends_selection', trends_key)
+def trends_selection(selected_bike, selected_membership, selected_season):
+    """
+    Aggregate the trips matching the Trends filters, once per filter combination.
+
+    Args:
+        selected_bike (str): Selected bike type ('electric', 'classic', or 'both').
+        selected_membership (list): List of selected membership types.
+        selected_season (list): Start and end season indices from the slider.
+
+    Returns:
+        dict: The per-month aggregates (``monthly``) and the trip counts by day
+            of the week (``weekday_counts``) of the selected trips. The result is
+            cached and must not be modified by callers.
+    """
+    selected_months = season_months(selected_season)
+
+    return {
+        'monthly': trip_cube.monthly(selected_bike, selected_membership, selected_months),
+        'weekday_counts': trip_cube.weekday_counts(selected_bike, selected_membership, selected_months),
+    }
+
 
 def update_card(selected_bike, selected_membership, selected_view, selected_season):
     """
@@ -1001,42 +1365,19 @@ def update_card(selected_bike, selected_membership, selected_view, selected_seas
               - Max Covered Distance
     """
 
-    start_season, end_season = selected_season
-    
-    # Filter data based on selected bike type
-    if selected_bike == 'electric':
-        df = combined_df[combined_df['Electric bike'] == True]
-    elif selected_bike == 'classic':
-        df = combined_df[combined_df['Electric bike'] == False]
-    else:
-        df = combined_df
-
-    # Filter data based on selected membership types
-    if 'all' not in selected_membership:
-        df = df[df['Membership type'].isin([m for m in selected_membership])]
-    
-    # Define months
-    season_indicator = ['Dec', 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov']
-    
-    selected_months = []
-    for season_index in range(start_season, end_season + 1):
-        start_month_index = season_index * 3
-        end_month_index = start_month_index + 2
-        selected_months.extend(season_indicator[start_month_index:end_month_index + 1])
-
-    # Filter data based on selected months
-    df = df[df['Month'].isin(selected_months)]
+    # Look up the trips matching the selected filters
+    monthly = trends_selection(selected_bike, selected_membership, selected_season)['monthly']
 
-    # Group by season, then by month, and calculate average count of bike departures
-    seasonal_bike_count = df.groupby(['Season', 'Month']).size().reset_index(name='Bike Count')
-    average_counts = seasonal_bike_count.groupby(['Month', 'Season'])['Bike Count'].mean().reset_index()
+    # Bike departures by season and month
+    seasonal_bike_count = monthly[['Season', 'Month', 'Bike Count']]
+    average_counts = monthly[['Month', 'Season', 'Bike Count']]
 
-    # Group by season, then by month, and calculate total and average covered distance of bike trips
-    seasonal_total_distance = df.groupby(['Season', 'Month'])['Covered distance (m)'].sum().reset_index(name='Total Covered Distance (m)')
-    seasonal_bike_distance = df.groupby(['Season', 'Month'])['Covered distance (m)'].mean().reset_index(name='Average Covered Distance (m)')
+    # Total and average covered distance of bike trips by season and month
+    seasonal_total_distance = monthly[['Season', 'Month', 'Total Covered Distance (m)']]
+    seasonal_bike_distance = monthly[['Season', 'Month', 'Average Covered Distance (m)']]
 
     # Define custom sort order for months
-    month_order = ['Dec', 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov']
+    month_order = SEASON_MONTHS
 
     # Sort the DataFrame by the 'Month' column using the custom order
     average_counts = average_counts.loc[average_counts['Month'].isin(month_order)]
@@ -1083,19 +1424,6 @@ def update_card(selected_bike, selected_membership, selected_view, selected_seas
             {'display': 'flex'}, {'display': 'none'}
         )
 
-# Callback function to update plot based on the selected view type
-@app.callback(
-   [Output('trend-plot', 'figure'),
-     Output('trends-title', 'children'),
-     Output('trends-url', 'pathname'),
-     Output('trends-url', 'search')],
-    [Input('table_filter_2', 'value'),
-     Input('table_filter_1', 'value'),
-     Input('table_filter_3','value'),
-     Input('season_range_slider', 'value')
-     ]
-)
-
 def update_chart(selected_bike, selected_membership, selected_view, selected_season):
     """
     Update the chart display based on selected parameters.
@@ -1107,44 +1435,22 @@ def update_chart(selected_bike, selected_membership, selected_view, selected_sea
     - selected_season (list): Selected season ('Winter', 'Spring', 'Summer', 'Fall') based on a slider.
 
     Returns:
-        tuple: A tuple containing three elements:
-            - The HTML content of the updated chart.
-            - The updated pathname for the chart URL.
-            - The updated search parameters for the chart URL.
+        tuple: The figure of the trend plot and its title.
     """
 
-    start_season, end_season = selected_season
-    
-    # Filter data based on selected bike type
-    if selected_bike == 'electric':
-        df = combined_df[combined_df['Electric bike'] == True]
-    elif selected_bike == 'classic':
-        df = combined_df[combined_df['Electric bike'] == False]
-    else:
-        df = combined_df
-
-    # Filter data based on selected membership type
-    if 'all' not in selected_membership:
-        df = df[df['Membership type'].isin([m for m in selected_membership])]
-    
     # Define custom sort order for months
-    month_order = ['Dec', 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov']    
-    
-    # Filter data based on selected months
-    selected_months = []
-    for season_index in range(start_season, end_season + 1):
-        start_month_index = season_index * 3
-        end_month_index = start_month_index + 2
-        selected_months.extend(month_order[start_month_index:end_month_index + 1])
+    month_order = SEASON_MONTHS
 
-    df = df[df['Month'].isin(selected_months)]
+    # Look up the trips matching the selected filters
+    monthly = trends_selection(selected_bike, selected_membership, selected_season)['monthly']
 
-    # Group by season, then by month, and calculate average count of bike departures
-    seasonal_bike_count = df.groupby(['Season', 'Month']).size().reset_index(name='Bike Count')
-    average_counts = seasonal_bike_count.groupby(['Month', 'Season'])['Bike Count'].mean().reset_index()
+    # Average count of bike departures by month and season
+    average_counts = monthly[['Month', 'Season', 'Bike Count']]
 
-    # Group by season, then by month, and calculate average covered distance of bike trips
-    seasonal_bike_distance = df.groupby(['Season', 'Month'])['Covered distance (m)'].mean().reset_index(name='Average Covered Distance (km)')
+    # Average covered distance of bike trips by season and month
+    seasonal_bike_distance = monthly[['Season', 'Month', 'Average Covered Distance (m)']].rename(
+        columns={'Average Covered Distance (m)': 'Average Covered Distance (km)'}
+    )
 
     # Convert distances from meters to kilometers
     seasonal_bike_distance['Average Covered Distance (km)'] /= 1000
@@ -1289,20 +1595,7 @@ def update_chart(selected_bike, selected_membership, selected_view, selected_sea
 
         title = "Average Covered Distance by Season and Month"
 
-    # Update URL parameters
-    pathname = f"/trends/{selected_view.lower()}"  # Update the pathname based on the selected view
-    search = f"selected_bike={selected_bike}&selected_membership={selected_membership}&selected_view={selected_view}&selected_season={selected_season}"  # Update the search based on user selections
-
-
-    return {'data': fig['data'], 'layout': fig['layout']}, title, pathname, search
-
-@app.callback(
-   [Output('polar-plot', 'figure')],
-    [Input('table_filter_2', 'value'),
-     Input('table_filter_1', 'value'),
-     Input('season_range_slider', 'value')
-     ]
-)
+    return {'data': fig['data'], 'layout': fig['layout']}, title
 
 def update_polar(selected_bike, selected_membership, selected_season):
     """
@@ -1314,42 +1607,20 @@ def update_polar(selected_bike, selected_membership, selected_season):
     - selected_season (list): Selected season ('Winter', 'Spring', 'Summer', 'Fall') based on a slider.
 
     Returns:
-        tuple: A tuple containing three elements:
-            - The HTML content of the updated polar plot.
-            - The updated pathname for the chart URL.
-            - The updated search parameters for the chart URL.
+        list: The polar plot figure of average trip duration by month, alone
+            in a list (an empty figure if no trips match the filters).
     """
     
-    start_season, end_season = selected_season
-    
-    # Filter data based on selected bike type
-    if selected_bike == 'electric':
-        df = combined_df[combined_df['Electric bike'] == True]
-    elif selected_bike == 'classic':
-        df = combined_df[combined_df['Electric bike'] == False]
-    else:
-        df = combined_df
-
-    # Filter data based on selected membership type
-    if 'all' not in selected_membership:
-        df = df[df['Membership type'].isin([m for m in selected_membership])]
-    
-    month_order = ['Dec', 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov']
-    
-    # Filter data based on selected months
-    selected_months = []
-    for season_index in range(start_season, end_season + 1):
-        start_month_index = season_index * 3
-        end_month_index = start_month_index + 2
-        selected_months.extend(month_order[start_month_index:end_month_index + 1])
-
-    df = df[df['Month'].isin(selected_months)]
+    # Look up the trips matching the selected filters
+    monthly = trends_selection(selected_bike, selected_membership, selected_season)['monthly']
     
     # Check if there are rows after filtering by membership type
-    if not df.empty:
-        # Aggregate duration by month
-        monthly_duration = df.groupby('Month')['Duration (sec.)'].sum()
-        months = df['Month'].unique()
+    if not monthly.empty:
+        # Total duration by month, in calendar order. Each bar's label is its
+        # own month: the original groupby ordered the bars alphabetically but
+        # labelled them in the order months appeared in the data.
+        monthly_duration = monthly['Duration (sec.)']
+        months = monthly['Month'].tolist()
         theta = np.linspace(0, 2 * np.pi, len(months), endpoint=False)
         width = (2 * np.pi) / len(months)
         duration = monthly_duration.values
@@ -1393,14 +1664,6 @@ def update_polar(selected_bike, selected_membership, selected_season):
         # Return an empty figure if there are no rows after filtering by membership type
         return [go.Figure()]
 
-# Callback function to update plot based on the selected filters
-@app.callback(
-   Output('bar-plot', 'figure'),
-   [Input('table_filter_2', 'value'),
-    Input('table_filter_1', 'value'),
-    Input('season_range_slider', 'value')]
-)
-
 def create_day_of_week_bar_plot(selected_bike, selected_membership, selected_season):
     """
     Update the bar plot based on selected parameters.
@@ -1411,39 +1674,11 @@ def create_day_of_week_bar_plot(selected_bike, selected_membership, selected_sea
     - selected_season (list): Selected season ('Winter', 'Spring', 'Summer', 'Fall') based on a slider.
 
     Returns:
-        tuple: A tuple containing three elements:
-            - The HTML content of the updated bar plot.
-            - The updated pathname for the chart URL.
-            - The updated search parameters for the chart URL.
+        plotly.graph_objects.Figure: The bar plot of trips by day of the week.
     """
 
-    # Filter data based on selected bike type
-    if selected_bike == 'electric':
-        filtered_df = combined_df[combined_df['Electric bike'] == True]
-    elif selected_bike == 'classic':
-        filtered_df = combined_df[combined_df['Electric bike'] == False]
-    else:
-        filtered_df = combined_df
-
-    # Filter data based on selected membership type
-    if 'all' not in selected_membership:
-        filtered_df = filtered_df[filtered_df['Membership type'].isin(selected_membership)]
-
-    # Assuming selected_season is a tuple with start and end seasons
-    start_season, end_season = selected_season
-    
-    season_indicator = ['Dec', 'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov']
-    # Filter data based on selected seasons
-    selected_months = []
-    for season_index in range(start_season, end_season + 1):
-        start_month_index = season_index * 3
-        end_month_index = start_month_index + 2
-        selected_months.extend(season_indicator[start_month_index:end_month_index + 1])
-
-    filtered_df = filtered_df[filtered_df['Month'].isin(selected_months)]
-
-    # Count trips by day of the week
-    trips_by_day = filtered_df['Day of Week'].value_counts()
+    # Look up the trips matching the selected filters by day of the week
+    trips_by_day = trends_selection(selected_bike, selected_membership, selected_season)['weekday_counts']
 
     # Sort days of the week
     sorted_days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
@@ -1465,6 +1700,75 @@ def create_day_of_week_bar_plot(selected_bike, selected_membership, selected_sea
 
     return fig
 
+# Callback function to update every Trends output from one filter selection
+@app.callback(
+    [Output('total-trips', 'children'),
+     Output('average-trips', 'children'),
+     Output('min-trips', 'children'),
+     Output('max-trips', 'children'),
+     Output('total-covered-distance', 'children'),
+     Output('average-covered-distance', 'children'),
+     Output('min-covered-distance', 'children'),
+     Output('max-distance', 'children'),
+     Output('covered_distance_card', 'style'),
+     Output('departure_count_card', 'style'),
+     Output('trend-plot', 'figure'),
+     Output('trends-title', 'children'),
+     Output('polar-plot', 'figure'),
+     Output('bar-plot', 'figure')],
+    [Input('table_filter_2', 'value'),
+     Input('table_filter_1', 'value'),
+     Input('table_filter_3', 'value'),
+     Input('season_range_slider', 'value')]
+)
+
+@memoized('update_trends', trends_view_key, response_size, share=True)
+def update_trends(selected_bike, selected_membership, selected_view, selected_season):
+    """
+    Update the summary cards, trend plot, polar plot and bar plot of the Trends tab.
+
+    The filters are applied once through ``trends_selection`` and the result is
+    shared by every output, so a filter change costs a single selection.
+
+    Parameters:
+    - selected_bike (str): Selected bike type ('electric', 'classic', or 'both').
+    - selected_membership (list): List of selected membership types.
+    - selected_view (str): Selected view ('departure count' or 'covered distance').
+    - selected_season (list): Selected season ('Winter', 'Spring', 'Summer', 'Fall') based on a slider.
+
+    Returns:
+        tuple: The outputs of ``update_card`` and ``update_chart``, followed by
+            the polar plot and the day of the week bar plot figures.
+    """
+    cards = update_card(selected_bike, selected_membership, selected_view, selected_season)
+    chart = update_chart(selected_bike, selected_membership, selected_view, selected_season)
+    [polar] = update_polar(selected_bike, selected_membership, selected_season)
+    bar = create_day_of_week_bar_plot(selected_bike, selected_membership, selected_season)
+
+    return (*cards, *chart, polar, bar)
+
+# Callback function to write the Trends filters to the address bar as a permalink.
+# It is skipped on the initial load, so the permalink being opened stays there.
+@app.callback(
+    [Output('trends-url', 'pathname'),
+     Output('trends-url', 'search')],
+    [Input('table_filter_2', 'value'),
+     Input('table_filter_1', 'value'),
+     Input('table_filter_3', 'value'),
+     Input('season_range_slider', 'value')],
+    prevent_initial_call=True
+)
+
+def update_trends_url(selected_bike, selected_membership, selected_view, selected_season):
+    """
+    Build the permalink of the selected Trends filters.
+
+    Returns:
+        tuple: The pathname and search of the permalink.
+    """
+    pathname, search = trends_permalink(selected_bike, selected_membership, selected_view, selected_season)
+    return app.get_relative_path(pathname), search
+
 # Tab 3
 map_layout = html.Div(
     [
@@ -1540,6 +1844,15 @@ map_layout = html.Div(
                                 )
                             ]
                         ),
+                        dbc.Row(
+                            [
+                                dbc.Col(dbc.Progress(id='map-progress', striped=True, animated=True)),
+                                dbc.Col(html.Button("Cancel", id="map-cancel"), width='auto')
+                            ],
+                            id='map-progress-row',
+                            align='center',
+                            style={'display': 'none'}
+                        ),
                         dbc.Card(
                             dbc.CardBody(
                                 html.Div(id='map-container', style={'font-weight': 'bold'})
@@ -1573,98 +1886,189 @@ map_layout = html.Div(
 
 # Define callback to update the map
 @app.callback(
-    [Output('map-container', 'children'),
-    Output('map-url', 'pathname'),
-    Output('map-url', 'search')],
+    Output('map-container', 'children'),
     [Input('map-month-range-slider', 'value'),  # RangeSlider input
      Input('bike-type-dropdown', 'value'),
      Input('plot-type-dropdown', 'value'),
-     Input('frequency-type-dropdown', 'value')]  # Dropdown input
+     Input('frequency-type-dropdown', 'value')],  # Dropdown input
+    background=True,
+    manager=background_manager,
+    running=[(Output('map-progress-row', 'style'), {'margin-top': '20px'}, {'display': 'none'})],
+    cancel=[Input('map-cancel', 'n_clicks')],
+    progress=[Output('map-progress', 'value'), Output('map-progress', 'label')],
+    progress_default=[0, ""]
 )
 
-def update_map(map_month_range, bike_type, plot_type, freq_type):
+def update_map(set_progress, map_month_range, bike_type, plot_type, freq_type):
     """
     Update the map based on user selections.
 
+    The map is rendered here, in a background job, into the map caches that
+    the frame's request to the map route then reads.
+
     Args:
-        value (list): The selected range of months.
+        set_progress (callable): Updates the map progress bar.
+        map_month_range (list): The selected range of months (0 is January).
         bike_type (str): The type of bike selected (either 'electric', 'classic', or 'both').
         plot_type (str): The type of plot selected (either 'marker plot' or 'heat map').
         freq_type (str): The frequency type selected (either 'all', 'top5', 'top10', or 'top20').
 
     Returns:
-        tuple: A tuple containing three elements:
-            - The HTML content of the updated map.
-            - The updated pathname for the map URL.
-            - The updated search parameters for the map URL.
+        dash.html.Iframe: The frame showing the rendered map.
     """
     
-    # Filtering based on bike type
-    if bike_type == 'electric':
-        df = combined_df[combined_df['Electric bike'] == True]
-    elif bike_type == 'classic':
-        df = combined_df[combined_df['Electric bike'] == False]
-    else:
-        df = combined_df
-    
-    departure_counts = df.groupby(['Departure station', 'Month']).agg({'Electric bike': 'count'}).reset_index()
-    return_counts = df.groupby(['Return station', 'Month']).agg({'Electric bike': 'count'}).reset_index()
+    # Convert float values to integers
+    map_month_range = [int(v) for v in map_month_range]
 
-    # Rename columns for clarity
-    departure_counts.columns = ['Station', 'Month', 'Departure Count']
-    return_counts.columns = ['Station', 'Month', 'Return Count']
+    # Point the frame at the cacheable map route instead of inlining the HTML
+    map_key = (tuple(map_month_range), bike_type, plot_type, freq_type)
+    job_render_map(*map_key, set_progress=set_progress)
 
-    # Merge the two DataFrames on Station and Month
-    combined_counts = pd.merge(departure_counts, return_counts, on=['Station', 'Month'], how='outer').fillna(0)
-    combined_counts['Total Count'] = combined_counts['Departure Count'] + combined_counts['Return Count']
+    return html.Iframe(src=map_view_url(map_key), width='100%', height='600')
 
-    combined_counts.drop(['Departure Count', 'Return Count'], axis = 1, inplace = True)
 
-    df2 = pd.merge(combined_counts, dfc, on = ['Station'])
+# Write the Map filters to the address bar as a permalink, except on the initial load
+@app.callback(
+    [Output('map-url', 'pathname'),
+     Output('map-url', 'search')],
+    [Input('map-month-range-slider', 'value'),
+     Input('bike-type-dropdown', 'value'),
+     Input('plot-type-dropdown', 'value'),
+     Input('frequency-type-dropdown', 'value')],
+    prevent_initial_call=True
+)
+def update_map_url(map_month_range, bike_type, plot_type, freq_type):
+    """
+    Build the permalink of the selected Map filters.
 
-    total_counts_by_station = df2.groupby(['Station', 'Coordinates', 'Link', 'Month'])['Total Count'].sum().reset_index(name='Total Count')
-    
-    # Obtain the coordinates of the markers.
-    marker_locations = total_counts_by_station.to_dict(orient='records')
-    
-    for entry in marker_locations:
-        entry['Coordinates'] = tuple(map(float, entry['Coordinates'].strip('()').split(', ')))
-    
-    # Convert float values to integers
-    map_month_range = [int(v) for v in map_month_range]
+    Returns:
+        tuple: The pathname and search of the permalink.
+    """
+    pathname, search = map_permalink(map_month_range, bike_type, plot_type, freq_type)
+    return app.get_relative_path(pathname), search
 
-    # Filter marker locations based on selected months
-    months = sorted(set(item['Month'] for item in marker_locations))
-    start_month = months[map_month_range[0]]
-    end_month = months[map_month_range[1]]
-    filtered_marker_locations = [item for item in marker_locations if start_month <= item['Month'] <= end_month]
-
-    # Aggregate counts for all months
-    aggregated_counts = {}
-    for item in filtered_marker_locations:
-        if item['Station'] not in aggregated_counts:
-            aggregated_counts[item['Station']] = 0
-        aggregated_counts[item['Station']] += item['Total Count']
-
-    # Sort stations based on total count
-    sorted_stations = sorted(aggregated_counts.keys(), key=lambda x: aggregated_counts[x], reverse=True)
-    
-    # Filter stations based on frequency type
-    if freq_type == 'top5':
-        filtered_stations = sorted_stations[:5]
-    elif freq_type == 'top10':
-        filtered_stations = sorted_stations[:10]
-    elif freq_type == 'top20':
-        filtered_stations = sorted_stations[:20]
+
+def map_view_url(map_key):
+    """
+    Build the URL of the map route for a set of map inputs.
+
+    Args:
+        map_key (tuple): The (map_month_range, bike_type, plot_type, freq_type) inputs.
+
+    Returns:
+        str: The relative URL serving the rendered map, versioned by the data and code build.
+    """
+    (start_month, end_month), bike_type, plot_type, freq_type = map_key
+    query = urlencode({
+        'start_month': start_month,
+        'end_month': end_month,
+        'bike_type': bike_type,
+        'plot_type': plot_type,
+        'freq_type': freq_type,
+        'v': RESULT_VERSION,
+    })
+    return app.get_relative_path(f"/map-view?{query}")
+
+
+def map_key_from_args(args):
+    """
+    Read and validate the map inputs from the query string of the map route.
+
+    Args:
+        args (werkzeug.datastructures.MultiDict): The request query arguments.
+
+    Returns:
+        tuple: The (map_month_range, bike_type, plot_type, freq_type) inputs.
+
+    Raises:
+        ValueError: If an input is missing or outside the values the map accepts.
+    """
+    start_month = int(args.get('start_month', ''))
+    end_month = int(args.get('end_month', ''))
+    bike_type = args.get('bike_type')
+    plot_type = args.get('plot_type')
+    freq_type = args.get('freq_type')
+
+    if not 0 <= start_month <= end_month < len(months):
+        raise ValueError(f"Invalid month range {start_month}-{end_month}")
+    if bike_type not in ('electric', 'classic', 'both'):
+        raise ValueError(f"Invalid bike type {bike_type!r}")
+    if plot_type not in ('marker plot', 'density plot'):
+        raise ValueError(f"Invalid plot type {plot_type!r}")
+    if freq_type not in ('all', 'top5', 'top10', 'top20'):
+        raise ValueError(f"Invalid frequency type {freq_type!r}")
+
+    return (start_month, end_month), bike_type, plot_type, freq_type
+
+
+@server.route('/map-view')
+def map_view():
+    """
+    Serve the rendered map for the inputs in the query string.
+
+    The response carries an ETag derived from the map inputs and the data
+    and code version, so browsers cache it and revalidate with a 304 response.
+    """
+    try:
+        map_key = map_key_from_args(request.args)
+    except ValueError:
+        abort(400)
+
+    etag = hashlib.sha1(repr((map_key, RESULT_VERSION)).encode()).hexdigest()
+    if etag in request.if_none_match:
+        response = Response(status=304)
     else:
-        filtered_stations = sorted_stations
-    
-    filtered_marker_locations = [item for item in filtered_marker_locations if item['Station'] in filtered_stations]
-    
-    # Calculate total count
-    total_count = sum(item['Total Count'] for item in filtered_marker_locations)
+        map_html = cached_render_map(*map_key)
+        response = Response(map_html, mimetype='text/html')
+
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 24 * 60 * 60
+    return response
+
+
+def render_map(map_month_range, bike_type, plot_type, freq_type, set_progress=None):
+    """
+    Render the Folium map for a set of map inputs.
+
+    Args:
+        map_month_range (tuple): The selected range of months (0 is January).
+        bike_type (str): The type of bike selected (either 'electric', 'classic', or 'both').
+        plot_type (str): The type of plot selected (either 'marker plot' or 'density plot').
+        freq_type (str): The frequency type selected (either 'all', 'top5', 'top10', or 'top20').
+        set_progress (callable): Receives the ``(percent, label)`` progress of the render.
+
+    Returns:
+        str: The HTML document of the rendered map.
+    """
+    if set_progress is None:
+        set_progress = lambda progress: None
+
+    # folium is only needed once a map is rendered, so it is not imported at startup
+    set_progress((10, "Loading map library"))
+    import folium
+    from folium.plugins import HeatMap
+
+    # Number of stations to show for each frequency type (all active stations otherwise)
+    station_limits = {'top5': 5, 'top10': 10, 'top20': 20}
+
+    # Rank the stations by activity over the selected months and bike type
+    set_progress((30, "Ranking stations"))
+    station_rows, station_totals = station_activity.top_stations(
+        map_month_range[0], map_month_range[1], bike_type, station_limits.get(freq_type)
+    )
+
+    # Obtain the coordinates of the markers.
+    stations = station_locations.iloc[station_rows]
+    filtered_marker_locations = [
+        {'Station': name, 'Coordinates': (lat, lon), 'Link': link, 'Total Count': int(total)}
+        for name, lat, lon, link, total in zip(
+            stations['Station'], stations['lat'], stations['lon'], stations['Link'], station_totals
+        )
+    ]
 
     # Create a Folium map centered around Vancouver
+    set_progress((50, "Placing stations"))
     map_vancouver = folium.Map(location=[49.2827, -123.1207], zoom_start=12)
 
     # Add GeoJSON boundary to the map
@@ -1688,20 +2092,121 @@ def update_map(map_month_range, bike_type, plot_type, freq_type):
             marker.add_child(folium.Popup(f"<a href='{link}' target='_blank'>Go to {name}</a>"))
             marker.add_to(map_vancouver)
 
-        # # Save the map to HTML and return it
-        # map_html = map_vancouver.get_root().render()
-        # return html.Iframe(srcDoc=map_html, width='100%', height='600')
     else:
         # Create HeatMap layer
         heatmap_data = [(loc['Coordinates'][0], loc['Coordinates'][1], loc['Total Count']) for loc in filtered_marker_locations]
         HeatMap(heatmap_data, radius=15, max_zoom=13).add_to(map_vancouver)
-    
-    pathname = f"/map/{plot_type.lower()}"  # Update the pathname based on the plot type
-    search = f"bike_type={bike_type}&freq_type={freq_type}&plot_type={plot_type}&map_month_range={map_month_range}"  # Update the search based on user selections
 
     # Save the map to HTML and return it
-    map_html = map_vancouver.get_root().render()
-    return html.Iframe(srcDoc=map_html, width='100%', height='600'), pathname, search
+    set_progress((80, "Rendering map"))
+    return map_vancouver.get_root().render()
+
+
+def warm_map_cache():
+    """
+    Render the default map views into the map cache, so first visits hit it.
+    """
+    for plot_type in ['marker plot', 'density plot']:
+        cached_render_map((0, len(months) - 1), 'both', plot_type, 'all')
+
+
+# Rendered map HTML keyed by the map inputs, bounded by entries and bytes
+map_cache = LRUCache(
+    max_entries=int(os.environ.get('MAP_CACHE_MAX_ENTRIES', 512)),
+    max_bytes=int(os.environ.get('MAP_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+)
+result_caches['map_view'] = map_cache
+
+# Rendered maps are also kept on disk (or in the shared cache, if configured)
+# so the map route finds a map rendered by a background job in any worker
+map_store = shared_cache or SharedCache(
+    SQLiteBackend(os.path.join(JOBS_DIR, 'maps.db'), max_bytes=map_cache.max_bytes)
+)
+cached_render_map = memoize(
+    map_cache, key=lambda *map_key, set_progress=None: map_key, version=lambda: RESULT_VERSION, shared=map_store
+)(render_map)
+
+# Renders the map in the map job, timed as a job step for /metrics
+job_render_map = job_metrics.instrument('render_map', cached_render_map)
+
+# Optionally render the default views at boot (e.g. MAP_CACHE_WARMUP=1)
+if os.environ.get('MAP_CACHE_WARMUP'):
+    warm_map_cache()
+
+
+def prerender_permalinks():
+    """
+    Compute the views of the most visited permalinks into the result caches.
+
+    Returns:
+        list: ``(url, visits)`` pairs of the permalinks rendered, most visited first.
+    """
+    rendered = []
+    for url, visits in visit_log.top(int(os.environ.get('PRERENDER_PERMALINKS', 20))):
+        pathname, _, search = url.partition('?')
+        permalink = parse_permalink(pathname, search)
+        if permalink is None:
+            continue
+
+        kind, args = permalink
+        if kind == 'trends':
+            update_trends(*args)
+        else:
+            map_month_range, bike_type, plot_type, freq_type = args
+            cached_render_map(tuple(map_month_range), bike_type, plot_type, freq_type)
+        rendered.append((url, visits))
+    return rendered
+
+
+def build_warm_state():
+    """
+    Compute the default view of every tab and the most visited permalinks,
+    and collect them for the warm state.
+
+    Returns:
+        dict: The Overview ``placeholders``, the pre-rendered ``permalinks``
+            and the entries of every result cache (``caches``) after
+            computing these views.
+    """
+    start_date, end_date = str(first_day), str(last_day)
+    update_first_row_cards(start_date, end_date)
+    update_first_col_cards(start_date, end_date)
+    update_second_col_cards(start_date, end_date)
+    update_trends('both', ['all'], 'departure count', [0, 3])
+    warm_map_cache()
+    permalinks = prerender_permalinks()
+
+    return {
+        'placeholders': placeholders,
+        'permalinks': permalinks,
+        'caches': {name: cache.items() for name, cache in result_caches.items()},
+    }
+
+
+def load_warm_state(state):
+    """
+    Fill the result caches with the default views of a warm state.
+
+    Args:
+        state (dict): The warm state from ``build_warm_state``.
+    """
+    for name, entries in state['caches'].items():
+        for key, value in entries:
+            result_caches[name].put(key, value)
+
+
+# Serve the default views from the snapshot's warm state, building and storing
+# it first if this data and code have none yet (ingest.py does so after
+# writing the snapshot, by importing the app). Workers booting together build
+# it once: the others wait for the lock, then read what the first one wrote.
+if warm_state_dir is not None:
+    if warm_state is None:
+        with warm_state_lock(warm_state_dir):
+            warm_state = read_warm_state(warm_state_dir, CODE_VERSION)
+            if warm_state is None:
+                warm_state = build_warm_state()
+                write_warm_state(warm_state_dir, CODE_VERSION, warm_state)
+    load_warm_state(warm_state)
 
 
 dashboard_tab = dcc.Tab(label='Overview', children=[dashboard_layout])
@@ -1709,9 +2214,12 @@ trends_tab = dbc.Tab(label="Trends", children=[trends_layout])
 map_tab = dbc.Tab(label="Map", children=[map_layout])
 
 app.layout = html.Div([
+    dcc.Location(id='permalink', refresh=False),
     header,
     dcc.Tabs(
-        [
+        id='tabs',
+        value='tab-1',
+        children=[
             dashboard_tab,
             trends_tab,
             map_tab
@@ -1730,5 +2238,91 @@ app.layout = html.Div([
 ])
 
 
+# Restore the filters of a Trends or Map permalink when it is opened, and when
+# the browser goes back or forward to one. The dcc.Tabs values default to
+# tab-1 (Overview), tab-2 (Trends) and tab-3 (Map).
+@app.callback(
+    [Output('tabs', 'value'),
+     Output('table_filter_2', 'value'),
+     Output('table_filter_1', 'value'),
+     Output('table_filter_3', 'value'),
+     Output('season_range_slider', 'value'),
+     Output('map-month-range-slider', 'value'),
+     Output('bike-type-dropdown', 'value'),
+     Output('plot-type-dropdown', 'value'),
+     Output('frequency-type-dropdown', 'value')],
+    [Input('permalink', 'pathname'),
+     Input('permalink', 'search')],
+    [State('table_filter_2', 'value'),
+     State('table_filter_1', 'value'),
+     State('table_filter_3', 'value'),
+     State('season_range_slider', 'value'),
+     State('map-month-range-slider', 'value'),
+     State('bike-type-dropdown', 'value'),
+     State('plot-type-dropdown', 'value'),
+     State('frequency-type-dropdown', 'value')]
+)
+def restore_permalink(pathname, search, *current):
+    """
+    Set the tab and filters of the permalink in the address bar.
+
+    Only the filters that differ from the current ones are set, so the views
+    are computed once, from the result caches when they hold the permalink's
+    view (e.g. the most visited ones, pre-rendered into the warm state).
+
+    Args:
+        pathname (str): The pathname of the page.
+        search (str): The query string of the page.
+        *current: The current values of the Trends and Map filters.
+
+    Returns:
+        tuple: The tab, then the Trends and Map filter values.
+    """
+    permalink = parse_permalink(pathname, search)
+    if permalink is None:
+        raise PreventUpdate
+
+    kind, args = permalink
+    if kind == 'trends':
+        tab, values = 'tab-2', [*args, *[no_update] * 4]
+    else:
+        tab, values = 'tab-3', [*[no_update] * 4, *args]
+
+    # Membership order does not change the view (permalinks keep them sorted),
+    # so the same memberships picked in another order are left as they are
+    if kind == 'trends' and sorted(set(current[1] or [])) == args[1]:
+        values[1] = no_update
+
+    # Switch tabs and count a visit when the page is opened, not on back and forward
+    if ctx.triggered_id is None:
+        visit_log.record(canonical_permalink(kind, args))
+    else:
+        tab = no_update
+
+    return (tab, *[no_update if value == now else value for value, now in zip(values, current)])
+
+# Record the latency, response size and errors of every callback, and of the
+# routes serving the map and downloads, for /metrics
+callback_metrics = CallbackMetrics(slow_seconds=slow_callback_seconds)
+instrument_callbacks(app, callback_metrics)
+instrument_routes(server, callback_metrics, ['map_view', 'download_zip', 'export_trips'])
+
+
+@server.route('/metrics')
+def metrics_view():
+    """
+    Serve the callback and cache metrics of this worker in the Prometheus text format.
+    """
+    caches = dict(result_caches, map_store=map_store)
+    if shared_cache is not None:
+        caches['shared'] = shared_cache
+    body = callback_metrics.render() + job_metrics.render() + render_cache_stats(caches)
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+
+if os.environ.get('IMPORT_TIME_REPORT'):
+    import_timer.report()
+
+
 if __name__ == '__main__':
     app.run_server()
\ No newline at end of file
@@ -0,0 +1,275 @@
+"""
+In-process caches for expensive dashboard outputs.
+"""
+
+import functools
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent computations of the same key into one.
+
+    The first caller of ``do`` for a key computes the value; callers arriving
+    while it runs wait for it and share its result, or its exception.
+    """
+
+    def __init__(self):
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, compute):
+        """
+        Return ``compute()``, or the result of the computation of ``key`` in progress.
+
+        Args:
+            key: Hashable key identifying the computation.
+            compute (callable): Computes the value.
+
+        Returns:
+            The computed value.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'done': threading.Event(), 'value': None, 'error': None}
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call['done'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['value']
+
+        try:
+            call['value'] = compute()
+            return call['value']
+        except BaseException as error:
+            call['error'] = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['done'].set()
+
+
+class LRUCache:
+    """
+    A thread-safe least-recently-used cache bounded by entry count and size.
+
+    Each entry's size is estimated with ``sizeof`` (string and bytes lengths by
+    default), and the least recently used entries are evicted once either
+    bound is exceeded. Entries older than ``ttl`` seconds are dropped when
+    looked up. Concurrent misses of one key are computed once by
+    ``get_or_compute``. Hits, misses, evictions, expirations and coalesced
+    misses are counted for reporting.
+
+    Args:
+        max_entries (int): Maximum number of entries to keep.
+        max_bytes (int): Maximum total estimated size of the cached values.
+        sizeof (callable): Function estimating the size of a value in bytes.
+        ttl (float): Seconds an entry stays valid, or ``None`` to keep entries
+            until they are evicted.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024, sizeof=None, ttl=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or _sizeof
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+
+    def get(self, key, default=None):
+        """Return the cached value for ``key``, marking it recently used."""
+        with self._lock:
+            if key in self._entries:
+                value, size, stored_at = self._entries[key]
+                if self.ttl is None or time.monotonic() - stored_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+
+                del self._entries[key]
+                self.current_bytes -= size
+                self.expirations += 1
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        """Store ``value`` under ``key``, evicting old entries to stay in bounds."""
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+
+            # Values larger than the whole cache are not worth keeping
+            if size > self.max_bytes:
+                return
+
+            self._entries[key] = (value, size, time.monotonic())
+            self.current_bytes += size
+
+            while len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """
+        Return the cached value for ``key``, computing and storing it on a miss.
+
+        Threads missing the same key while it is computed wait for that
+        computation instead of starting their own.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = self._flight.do(key, lambda: self._compute_and_put(key, compute))
+        return value
+
+    def _compute_and_put(self, key, compute):
+        """Compute and store the value for ``key``, unless a computation just stored it."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (self.ttl is None or time.monotonic() - entry[2] <= self.ttl):
+                return entry[0]
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def items(self):
+        """Return the ``(key, value)`` pairs of the entries, least recently used first."""
+        with self._lock:
+            return [(key, entry[0]) for key, entry in self._entries.items()]
+
+    def clear(self):
+        """Drop every entry, keeping the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def stats(self):
+        """
+        Report the cache counters.
+
+        Returns:
+            dict: Entry count, estimated bytes, hits, misses, evictions,
+                expirations, coalesced misses and hit rate.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'coalesced': self._flight.coalesced,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+def canonical(value):
+    """
+    Turn call arguments into a hashable cache key.
+
+    Lists become tuples and dicts and sets are sorted, so equal arguments
+    give equal keys. Order-insensitive lists (such as a multi-select value)
+    must be sorted by the caller, since list order is kept here.
+
+    Args:
+        value: The arguments, e.g. an ``(args, kwargs)`` pair.
+
+    Returns:
+        The hashable key.
+    """
+    if isinstance(value, (list, tuple)):
+        return tuple(canonical(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, canonical(item)) for key, item in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(canonical(item) for item in value))
+    return value
+
+
+def memoize(cache, key=None, version=None, shared=None):
+    """
+    Cache a function's results in ``cache``, keyed by its arguments.
+
+    The cached results are shared between callers and must not be modified.
+    With a ``shared`` cache, results missing from ``cache`` are looked up
+    there before they are computed, so workers reuse each other's results.
+
+    Args:
+        cache (LRUCache): Where to keep the results.
+        key (callable): Maps the call's arguments to a hashable key; by default
+            the arguments are passed through ``canonical``.
+        version (callable): Returns the version of the data and code the
+            results are computed with; the cache is cleared whenever it changes.
+        shared (shared_cache.SharedCache): Cache shared with other workers,
+            keyed by that version and the function's name.
+
+    Returns:
+        callable: The decorator. The decorated function has ``cache`` and
+            ``cache_clear`` attributes.
+    """
+    def decorator(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+        versions = [version() if version else None]
+
+        @functools.wraps(func)
+        def memoized(*args, **kwargs):
+            if version is not None:
+                current = version()
+                if current != versions[0]:
+                    versions[0] = current
+                    cache.clear()
+
+            cache_key = key(*args, **kwargs) if key else canonical((args, kwargs))
+            if shared is None:
+                return cache.get_or_compute(cache_key, lambda: func(*args, **kwargs))
+            return cache.get_or_compute(
+                cache_key,
+                lambda: shared.get_or_compute(versions[0], name, cache_key, lambda: func(*args, **kwargs))
+            )
+
+        memoized.cache = cache
+        memoized.cache_clear = cache.clear
+        return memoized
+
+    return decorator
+
+
+def _sizeof(value):
+    """Estimate the size of a cached value in bytes."""
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_sizeof(item) for item in value.values())
+    if hasattr(value, 'memory_usage'):
+        # pandas objects; a DataFrame reports its usage per column
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if hasattr(usage, 'sum') else usage)
+    return sys.getsizeof(value)
@@ -0,0 +1,96 @@
+"""
+Streaming exports of filtered trips.
+
+The generators here serialise a trip table chunk by chunk, so a response can
+start sending rows before the whole selection is encoded and never holds
+more than one chunk of output in memory.
+"""
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Columns derived by ingest.py that are not part of the exported trips
+DERIVED_COLUMNS = ['Month', 'Season', 'Day of Week']
+
+# Rows serialised per CSV chunk or Parquet row group
+CHUNK_ROWS = 50_000
+
+EXPORT_FORMATS = {
+    'csv': {'mimetype': 'text/csv', 'extension': 'csv'},
+    'parquet': {'mimetype': 'application/vnd.apache.parquet', 'extension': 'parquet'},
+}
+
+
+def export_columns(df):
+    """Return the columns of ``df`` included in exports."""
+    return [column for column in df.columns if column not in DERIVED_COLUMNS]
+
+
+def stream_csv(df, chunk_rows=CHUNK_ROWS):
+    """
+    Serialise trips as CSV, one chunk of rows at a time.
+
+    Args:
+        df (pandas.DataFrame): The trips to export.
+        chunk_rows (int): Number of rows per chunk.
+
+    Yields:
+        bytes: UTF-8 encoded CSV text, starting with the header row.
+    """
+    columns = export_columns(df)
+    yield df.iloc[:0][columns].to_csv(index=False).encode()
+
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows][columns]
+        yield chunk.to_csv(header=False, index=False).encode()
+
+
+def stream_parquet(df, chunk_rows=CHUNK_ROWS):
+    """
+    Serialise trips as a Parquet file, one row group at a time.
+
+    Args:
+        df (pandas.DataFrame): The trips to export.
+        chunk_rows (int): Number of rows per row group.
+
+    Yields:
+        bytes: Consecutive pieces of the Parquet file.
+    """
+    columns = export_columns(df)
+    schema = pa.Schema.from_pandas(df.iloc[:0][columns], preserve_index=False)
+    sink = _ChunkSink()
+
+    with pq.ParquetWriter(sink, schema) as writer:
+        for start in range(0, len(df), chunk_rows):
+            chunk = df.iloc[start:start + chunk_rows][columns]
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            yield sink.drain()
+    yield sink.drain()
+
+
+class _ChunkSink:
+    """A write-only file object collecting output until it is drained."""
+
+    def __init__(self):
+        self.closed = False
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
@@ -0,0 +1,68 @@
+"""
+Opt-in report of the time spent importing each module at startup.
+
+Set ``IMPORT_TIME_REPORT=1`` to log, once the app has loaded, the modules
+that took longest to import. Times are measured around ``import``
+statements: a module's own time excludes the imports it triggers.
+"""
+
+import builtins
+import logging
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+_original_import = builtins.__import__
+_stack = []
+_timings = {}
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    """Time ``__import__`` calls that load a module for the first time."""
+    if level or name in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+
+    _stack.append(0.0)
+    start = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.perf_counter() - start
+        nested = _stack.pop()
+        if _stack:
+            _stack[-1] += elapsed
+        _timings[name] = (elapsed - nested, elapsed)
+
+
+def install():
+    """Start timing imports."""
+    builtins.__import__ = _timed_import
+
+
+def uninstall():
+    """Stop timing imports, keeping the timings collected so far."""
+    builtins.__import__ = _original_import
+
+
+def report(limit=25):
+    """
+    Log the modules that took longest to import and stop timing.
+
+    Args:
+        limit (int): Number of modules to list.
+
+    Returns:
+        list: ``(module, self_seconds, total_seconds)`` tuples, slowest first.
+    """
+    uninstall()
+    rows = sorted(
+        ((name, own, total) for name, (own, total) in _timings.items()),
+        key=lambda row: row[1],
+        reverse=True
+    )[:limit]
+
+    logger.info("Slowest imports (self / cumulative ms):")
+    for name, own, total in rows:
+        logger.info("  %-40s %8.1f %8.1f", name, own * 1000, total * 1000)
+    return rows
@@ -0,0 +1,682 @@
+"""
+Build the processed trip table used by the dashboard from the raw Mobi exports.
+
+Mobi publishes one ``Mobi_System_Data_YYYY-MM.csv`` file per month into
+``data/raw``. This module reads those files, derives the columns the dashboard
+needs (``Month``, ``Season`` and ``Day of Week``), parses the ``Departure`` and
+``Return`` timestamps once, and writes one typed Parquet partition per month
+to ``data/processed/trips``. The app loads the partitions instead of
+re-parsing the CSVs on every worker boot.
+
+Ingestion is incremental: ``data/processed/manifest.json`` records the
+checksum of the raw file behind each partition, so only new or changed months
+are re-read and partitions of deleted files are removed.
+
+Run from the ``src`` directory:
+
+    python ingest.py
+"""
+
+import argparse
+import calendar
+import fcntl
+import glob
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import zipfile
+from contextlib import contextmanager
+
+import pandas as pd
+
+from queries import date_range_bounds, sort_by_departure
+
+# Paths are resolved relative to this file so the ingest works from any cwd
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+RAW_DIR = os.path.join(DATA_DIR, 'raw')
+# MOBI_PROCESSED_DIR points the app and ingest at another processed dataset,
+# e.g. the synthetic trips generated by benchmarks/synthetic.py
+PROCESSED_DIR = os.environ.get('MOBI_PROCESSED_DIR', os.path.join(DATA_DIR, 'processed'))
+TRIPS_DIR = os.path.join(PROCESSED_DIR, 'trips')
+MANIFEST_PATH = os.path.join(PROCESSED_DIR, 'manifest.json')
+COORDINATES_PATH = os.path.join(DATA_DIR, 'coordinates', 'station_coordinates.csv')
+EXPORT_PATH = os.path.join(PROCESSED_DIR, 'cyclesync_bikeshare.zip')
+
+# Rows written to the export CSV at a time
+EXPORT_CHUNK_ROWS = 100_000
+
+RAW_PATTERN = 'Mobi_System_Data_*.csv'
+RAW_NAME = re.compile(r'Mobi_System_Data_(\d{4})-(\d{2})\.csv$')
+
+# Columns shared by every monthly export, in the order they are published.
+# Later exports add a 'Bike' id column which the dashboard does not use.
+RAW_COLUMNS = [
+    'Departure',
+    'Return',
+    'Electric bike',
+    'Departure station',
+    'Return station',
+    'Membership type',
+    'Covered distance (m)',
+    'Duration (sec.)',
+    'Departure temperature (C)',
+    'Return temperature (C)',
+    'Stopover duration (sec.)',
+    'Number of stopovers',
+]
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M'
+
+MONTHS = list(calendar.month_abbr)[1:]
+WEEKDAYS = list(calendar.day_name)
+
+SEASONS = {
+    'Dec': 'Winter', 'Jan': 'Winter', 'Feb': 'Winter',
+    'Mar': 'Spring', 'Apr': 'Spring', 'May': 'Spring',
+    'Jun': 'Summer', 'Jul': 'Summer', 'Aug': 'Summer',
+    'Sep': 'Fall', 'Oct': 'Fall', 'Nov': 'Fall',
+}
+SEASON_NAMES = ['Winter', 'Spring', 'Summer', 'Fall']
+
+# Months in season order, so each season is three consecutive entries
+SEASON_MONTHS = MONTHS[-1:] + MONTHS[:-1]
+
+# Compact in-memory schema for the trip table. Stations and membership types
+# repeat across every trip, so they are stored as categorical codes; the
+# calendar columns keep calendar order so groupbys and sorts come out right.
+# Both station columns share one set of categories (see compact_trips).
+TRIP_DTYPES = {
+    'Departure station': 'category',
+    'Return station': 'category',
+    'Membership type': 'category',
+    'Month': pd.CategoricalDtype(MONTHS, ordered=True),
+    'Season': pd.CategoricalDtype(SEASON_NAMES, ordered=True),
+    'Day of Week': pd.CategoricalDtype(WEEKDAYS, ordered=True),
+    'Covered distance (m)': 'float32',
+    'Duration (sec.)': 'int32',
+    'Departure temperature (C)': 'float32',
+    'Return temperature (C)': 'float32',
+    'Stopover duration (sec.)': 'int32',
+    'Number of stopovers': 'int8',
+}
+
+logger = logging.getLogger(__name__)
+
+
+def raw_files(raw_dir=RAW_DIR):
+    """
+    List the monthly raw exports in publication order.
+
+    Args:
+        raw_dir (str): Directory holding the ``Mobi_System_Data_YYYY-MM.csv`` files.
+
+    Returns:
+        list: Sorted paths of the monthly CSV files.
+    """
+    return sorted(glob.glob(os.path.join(raw_dir, RAW_PATTERN)))
+
+
+def read_raw_month(path):
+    """
+    Read one monthly export and return only the trips it contains.
+
+    Some exports are not valid UTF-8 and most are padded with empty rows, so
+    the file is decoded with a Latin-1 fallback and blank rows are dropped.
+
+    Args:
+        path (str): Path to a ``Mobi_System_Data_YYYY-MM.csv`` file.
+
+    Returns:
+        pandas.DataFrame: The trips in the file, restricted to ``RAW_COLUMNS``.
+    """
+    try:
+        df = pd.read_csv(path, usecols=RAW_COLUMNS, dtype=str, encoding='utf-8')
+    except UnicodeDecodeError:
+        df = pd.read_csv(path, usecols=RAW_COLUMNS, dtype=str, encoding='latin-1')
+
+    # Drop the padding rows that carry no trip at all
+    df = df.dropna(how='all')
+
+    return df[RAW_COLUMNS]
+
+
+def prepare_trips(df):
+    """
+    Parse raw string columns and derive the calendar columns used by the app.
+
+    Args:
+        df (pandas.DataFrame): Trips as read by ``read_raw_month``.
+
+    Returns:
+        pandas.DataFrame: Trips with parsed timestamps, numeric measures and the
+            derived ``Month``, ``Season`` and ``Day of Week`` columns.
+    """
+    df = df.copy()
+
+    # Parse timestamps once so the app never has to
+    df['Departure'] = pd.to_datetime(df['Departure'], format=TIMESTAMP_FORMAT, errors='coerce')
+    df['Return'] = pd.to_datetime(df['Return'], format=TIMESTAMP_FORMAT, errors='coerce')
+
+    df['Electric bike'] = df['Electric bike'].str.upper() == 'TRUE'
+
+    for column in RAW_COLUMNS[6:]:
+        df[column] = pd.to_numeric(df[column], errors='coerce')
+
+    # Derive the calendar columns from the departure time
+    df['Month'] = df['Departure'].dt.strftime('%b')
+    df['Season'] = df['Month'].map(SEASONS)
+    df['Day of Week'] = df['Departure'].dt.day_name()
+
+    return df
+
+
+def compact_trips(df):
+    """
+    Cast the trip table to the compact ``TRIP_DTYPES`` schema.
+
+    Integer columns that contain missing values are stored as float32 instead,
+    since numpy integers cannot hold NaN. ``Departure station`` and ``Return
+    station`` share one sorted list of categories, so a station has the same
+    code in both columns and codes can index per-station arrays directly.
+
+    Args:
+        df (pandas.DataFrame): The trip table.
+
+    Returns:
+        pandas.DataFrame: The trip table using categorical and downcast dtypes.
+    """
+    stations = pd.Index(df['Departure station'].dropna().unique()).union(
+        pd.Index(df['Return station'].dropna().unique())
+    )
+    station_dtype = pd.CategoricalDtype(stations.astype(str))
+
+    dtypes = {}
+    for column, dtype in TRIP_DTYPES.items():
+        if column not in df:
+            continue
+        if column in ('Departure station', 'Return station'):
+            dtype = station_dtype
+        if dtype in ('int8', 'int32') and df[column].isna().any():
+            dtype = 'float32'
+        dtypes[column] = dtype
+
+    return df.astype(dtypes)
+
+
+def log_memory_usage(df, name='combined_df'):
+    """
+    Log the in-memory size of each column of a DataFrame on a single line.
+
+    Args:
+        df (pandas.DataFrame): The DataFrame to measure.
+        name (str): Label used in the log line.
+    """
+    usage = df.memory_usage(index=False, deep=True)
+    columns = ', '.join(f"{column}={nbytes}" for column, nbytes in usage.items())
+    logger.info("%s: %d rows, %d bytes (%s)", name, len(df), usage.sum(), columns)
+
+
+def partition_key(path):
+    """
+    Return the ``YYYY-MM`` month a raw export was published for.
+
+    Args:
+        path (str): Path to a ``Mobi_System_Data_YYYY-MM.csv`` file.
+
+    Returns:
+        str: The month of the export, e.g. ``'2023-12'``.
+
+    Raises:
+        ValueError: If the file name does not follow the Mobi naming scheme.
+    """
+    match = RAW_NAME.search(os.path.basename(path))
+    if match is None:
+        raise ValueError(f"Unexpected raw export name {os.path.basename(path)!r}")
+    return f"{match.group(1)}-{match.group(2)}"
+
+
+def file_checksum(path):
+    """
+    Compute the sha256 checksum of a file, reading it in blocks.
+
+    Args:
+        path (str): The file to hash.
+
+    Returns:
+        str: The hex digest of the file contents.
+    """
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def build_partition(path):
+    """
+    Read one monthly export into a typed trip partition.
+
+    Args:
+        path (str): Path to a ``Mobi_System_Data_YYYY-MM.csv`` file.
+
+    Returns:
+        pandas.DataFrame: The month's trips, sorted by departure time.
+    """
+    return sort_by_departure(compact_trips(prepare_trips(read_raw_month(path))))
+
+
+def write_parquet(df, path):
+    """
+    Write a DataFrame to Parquet, replacing any previous file atomically.
+
+    Args:
+        df (pandas.DataFrame): The table to store.
+        path (str): Destination of the Parquet file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Write next to the destination then swap, so a concurrently booting
+    # worker never reads a half-written file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def read_manifest(path=MANIFEST_PATH):
+    """
+    Read the ingest manifest describing the processed partitions.
+
+    Args:
+        path (str): Location of ``manifest.json``.
+
+    Returns:
+        dict: Partition metadata keyed by ``YYYY-MM`` month, empty if nothing
+            has been ingested yet. Each entry holds the ``source`` file name, its
+            ``sha256``, the partition ``path`` relative to the manifest, the
+            number of ``rows`` and the ``first_departure``/``last_departure``.
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)['partitions']
+    except FileNotFoundError:
+        return {}
+
+
+def write_manifest(partitions, path=MANIFEST_PATH):
+    """
+    Replace the ingest manifest atomically.
+
+    Args:
+        partitions (dict): Partition metadata keyed by ``YYYY-MM`` month.
+        path (str): Location of ``manifest.json``.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'partitions': dict(sorted(partitions.items()))}, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def ingest(raw_dir=RAW_DIR, manifest_path=MANIFEST_PATH, full=False):
+    """
+    Bring the monthly trip partitions up to date with the raw exports.
+
+    Raw files whose checksum matches the manifest are skipped; new or changed
+    files are re-read into their month's partition, and partitions whose raw
+    file has disappeared are deleted. The manifest is rewritten last, so an
+    interrupted run is simply redone on the next one.
+
+    Args:
+        raw_dir (str): Directory holding the monthly raw exports.
+        manifest_path (str): Location of ``manifest.json``; partitions are
+            written to a ``trips`` directory next to it.
+        full (bool): Re-read every raw file regardless of its checksum.
+
+    Returns:
+        dict: The months that were ``added``, ``updated``, ``removed`` and left
+            ``unchanged`` by this run.
+    """
+    paths = raw_files(raw_dir)
+    if not paths:
+        raise FileNotFoundError(f"No raw exports matching {RAW_PATTERN} in {raw_dir}")
+
+    processed_dir = os.path.dirname(manifest_path)
+    previous = read_manifest(manifest_path)
+    partitions = {}
+    changes = {'added': [], 'updated': [], 'removed': [], 'unchanged': []}
+
+    for path in paths:
+        key = partition_key(path)
+        checksum = file_checksum(path)
+        entry = previous.get(key)
+        if (not full and entry is not None and entry['sha256'] == checksum
+                and os.path.exists(os.path.join(processed_dir, entry['path']))):
+            partitions[key] = entry
+            changes['unchanged'].append(key)
+            continue
+
+        df = build_partition(path)
+        year, month = key.split('-')
+        relative_path = os.path.join('trips', year, f"{month}.parquet")
+        write_parquet(df, os.path.join(processed_dir, relative_path))
+
+        departure = df['Departure'].dropna()
+        partitions[key] = {
+            'source': os.path.basename(path),
+            'sha256': checksum,
+            'path': relative_path,
+            'rows': len(df),
+            'first_departure': departure.min().isoformat() if len(departure) else None,
+            'last_departure': departure.max().isoformat() if len(departure) else None,
+        }
+        changes['added' if entry is None else 'updated'].append(key)
+        logger.info("Ingested %s: %d trips from %s", key, len(df), os.path.basename(path))
+
+    for key in sorted(set(previous) - set(partitions)):
+        stale_path = os.path.join(processed_dir, previous[key]['path'])
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
+        changes['removed'].append(key)
+        logger.info("Removed %s: %s is no longer in %s", key, previous[key]['source'], raw_dir)
+
+    write_manifest(partitions, manifest_path)
+    return changes
+
+
+@contextmanager
+def ingest_lock(manifest_path=MANIFEST_PATH):
+    """
+    Hold the lock serialising ingests into the manifest's directory.
+
+    Args:
+        manifest_path (str): Location of ``manifest.json``.
+    """
+    processed_dir = os.path.dirname(os.path.abspath(manifest_path))
+    os.makedirs(processed_dir, exist_ok=True)
+    with open(os.path.join(processed_dir, '.ingest.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def ensure_ingested(raw_dir=RAW_DIR, manifest_path=MANIFEST_PATH):
+    """
+    Ingest the raw exports if nothing has been ingested yet.
+
+    Workers booting together on a fresh checkout ingest once: the first one
+    to take the lock writes the partitions and manifest, and the others wait
+    for it, then find the manifest and read what it wrote.
+
+    Args:
+        raw_dir (str): Directory holding the monthly raw exports.
+        manifest_path (str): Location of ``manifest.json``.
+    """
+    if os.path.exists(manifest_path):
+        return
+    with ingest_lock(manifest_path):
+        if not os.path.exists(manifest_path):
+            ingest(raw_dir, manifest_path)
+
+
+def select_partitions(partitions, start_date=None, end_date=None, months=None):
+    """
+    Prune the manifest to the partitions that can hold trips in a window.
+
+    A partition is kept when its departures, from ``first_departure`` to
+    ``last_departure``, overlap the date range and fall in at least one of the
+    selected calendar months. Months are checked against the departure span
+    rather than the partition's own month, since trips near the end of a
+    month can be published in the previous month's file.
+
+    Args:
+        partitions (dict): Partition metadata keyed by ``YYYY-MM`` month.
+        start_date (str): First day of the window, or ``None`` for no lower bound.
+        end_date (str): Last day of the window, or ``None`` for no upper bound.
+        months (list): Abbreviated month names to keep, or ``None`` for all.
+
+    Returns:
+        dict: The partitions intersecting the window.
+    """
+    start = pd.Timestamp(start_date).normalize() if start_date is not None else None
+    end = pd.Timestamp(end_date).normalize() + pd.Timedelta(days=1) if end_date is not None else None
+
+    selected = {}
+    for key, entry in partitions.items():
+        if entry['first_departure'] is None:
+            # Only trips without a departure time, which no window selects
+            if start is None and end is None and months is None:
+                selected[key] = entry
+            continue
+
+        first = pd.Timestamp(entry['first_departure'])
+        last = pd.Timestamp(entry['last_departure'])
+        if (start is not None and last < start) or (end is not None and first >= end):
+            continue
+
+        if months is not None:
+            span = pd.period_range(first, last, freq='M').strftime('%b')
+            if not set(span) & set(months):
+                continue
+
+        selected[key] = entry
+    return selected
+
+
+def load_trips(manifest_path=MANIFEST_PATH, raw_dir=RAW_DIR, start_date=None, end_date=None, months=None):
+    """
+    Load the processed trip table, ingesting the raw exports if needed.
+
+    Only the partitions intersecting the requested window are read (see
+    ``select_partitions``), and their trips are trimmed to it, so memory use
+    follows the window rather than the whole history. The partitions are
+    combined into one table in the compact ``TRIP_DTYPES`` schema, sorted by
+    departure time, and its per-column memory usage is logged.
+
+    Args:
+        manifest_path (str): Location of ``manifest.json``.
+        raw_dir (str): Directory holding the monthly raw exports.
+        start_date (str): First day to load, or ``None`` to start at the first trip.
+        end_date (str): Last day to load, or ``None`` to end at the last trip.
+        months (list): Abbreviated month names to load, or ``None`` for all.
+
+    Returns:
+        pandas.DataFrame: The processed trip table.
+    """
+    ensure_ingested(raw_dir, manifest_path)
+
+    processed_dir = os.path.dirname(manifest_path)
+    partitions = read_manifest(manifest_path)
+    selected = select_partitions(partitions, start_date, end_date, months)
+
+    if selected:
+        df = pd.concat(
+            [pd.read_parquet(os.path.join(processed_dir, entry['path'])) for entry in selected.values()],
+            ignore_index=True
+        )
+    else:
+        # Nothing intersects the window: read one partition for its schema only
+        first_entry = next(iter(partitions.values()))
+        df = pd.read_parquet(os.path.join(processed_dir, first_entry['path'])).iloc[:0]
+    df = sort_by_departure(compact_trips(df))
+
+    # Trim the partitions on the edges of the window to the window itself
+    if len(df) and (start_date is not None or end_date is not None):
+        start, stop = date_range_bounds(
+            df,
+            start_date if start_date is not None else df['Departure'].min(),
+            end_date if end_date is not None else df['Departure'].max()
+        )
+        df = df.iloc[start:stop]
+    if months is not None:
+        df = df[df['Month'].isin(months)]
+    df = df.reset_index(drop=True)
+    log_memory_usage(df)
+
+    return df
+
+
+def data_version(manifest_path=MANIFEST_PATH):
+    """
+    Identify the current build of the processed trip table.
+
+    Args:
+        manifest_path (str): Location of ``manifest.json``.
+
+    Returns:
+        str: A short hash of the raw file checksums behind the partitions,
+            which changes whenever a month is added, updated or removed.
+    """
+    partitions = read_manifest(manifest_path)
+    checksums = ','.join(f"{key}:{entry['sha256']}" for key, entry in sorted(partitions.items()))
+    return hashlib.sha1(checksums.encode()).hexdigest()[:12]
+
+
+def load_station_coordinates(path=COORDINATES_PATH):
+    """
+    Load the station coordinates with the ``Coordinates`` strings parsed once.
+
+    Args:
+        path (str): Location of ``station_coordinates.csv``.
+
+    Returns:
+        pandas.DataFrame: The ``Station``, ``Coordinates`` and ``Link`` columns
+            of the file plus float ``lat`` and ``lon`` columns.
+    """
+    dfc = pd.read_csv(path)
+
+    # Coordinates are stored as strings like "(49.26, -123.11)"
+    lat_lon = dfc['Coordinates'].str.strip('()').str.split(',', expand=True)
+    dfc['lat'] = lat_lon[0].astype(float)
+    dfc['lon'] = lat_lon[1].astype(float)
+
+    return dfc
+
+
+def align_stations(dfc, stations):
+    """
+    Reorder the station coordinates so row ``i`` describes station code ``i``.
+
+    Args:
+        dfc (pandas.DataFrame): Station coordinates from ``load_station_coordinates``.
+        stations (pandas.Index): The station categories of the trip table.
+
+    Returns:
+        pandas.DataFrame: One row per station category, with NaN ``lat``/``lon``
+            for stations that have no known coordinates.
+    """
+    return dfc.set_index('Station').reindex(stations).rename_axis('Station').reset_index()
+
+
+def write_export(df, dfc, version, path=EXPORT_PATH, progress=None):
+    """
+    Write the "Download Raw Data" zip and a sidecar file with its checksum.
+
+    The zip holds ``Ride Data.csv`` (every trip with a departure and return
+    station, as shown on the dashboard, without the derived calendar columns)
+    and ``Station Coordinates.csv``. The CSV is streamed into the archive in chunks, so no
+    full CSV copy of the trips is held in memory or on disk.
+
+    Args:
+        df (pandas.DataFrame): The trip table.
+        dfc (pandas.DataFrame): Station coordinates.
+        version (str): The data version the export is built from.
+        path (str): Destination of the zip file.
+        progress (callable): Called with the fraction of trips written after each chunk.
+
+    Returns:
+        dict: The export metadata (``path``, ``data_version``, ``sha256`` and ``size``).
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    rides = df.dropna(subset=['Departure station', 'Return station']).drop(columns=['Month', 'Season', 'Day of Week'])
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_DEFLATED) as zip_file:
+        with io.TextIOWrapper(zip_file.open('Ride Data.csv', 'w'), encoding='utf-8', newline='') as csv_file:
+            for start in range(0, max(len(rides), 1), EXPORT_CHUNK_ROWS):
+                chunk = rides.iloc[start:start + EXPORT_CHUNK_ROWS]
+                chunk.to_csv(csv_file, header=start == 0, index=False)
+                if progress is not None:
+                    progress(min(start + EXPORT_CHUNK_ROWS, len(rides)) / max(len(rides), 1))
+        zip_file.writestr('Station Coordinates.csv', dfc.drop(columns=['lat', 'lon']).to_csv(index=False))
+
+    metadata = {
+        'path': path,
+        'data_version': version,
+        'sha256': file_checksum(tmp_path),
+        'size': os.path.getsize(tmp_path),
+    }
+    os.replace(tmp_path, path)
+
+    metadata_tmp_path = f"{path}.json.{os.getpid()}.tmp"
+    with open(metadata_tmp_path, 'w') as f:
+        json.dump(metadata, f)
+    os.replace(metadata_tmp_path, f"{path}.json")
+
+    return metadata
+
+
+def read_export_metadata(path=EXPORT_PATH):
+    """
+    Read the metadata written next to the export zip by ``write_export``.
+
+    Args:
+        path (str): Location of the zip file.
+
+    Returns:
+        dict: The export metadata, or ``None`` if there is no complete export.
+    """
+    try:
+        with open(f"{path}.json") as f:
+            metadata = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if not os.path.exists(path) or os.path.getsize(path) != metadata.get('size'):
+        return None
+    return metadata
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the processed Mobi trip partitions from the raw monthly exports.")
+    parser.add_argument('--raw-dir', default=RAW_DIR, help="directory holding Mobi_System_Data_YYYY-MM.csv files")
+    parser.add_argument('--manifest', default=MANIFEST_PATH, help="path of the manifest; partitions are written next to it")
+    parser.add_argument('--export', default=EXPORT_PATH, help="path of the download zip to write")
+    parser.add_argument('--coordinates', default=COORDINATES_PATH, help="path of station_coordinates.csv")
+    parser.add_argument('--full', action='store_true', help="re-read every raw file instead of only new or changed ones")
+    args = parser.parse_args()
+
+    with ingest_lock(args.manifest):
+        changes = ingest(args.raw_dir, args.manifest, full=args.full)
+    for change in ('added', 'updated', 'removed'):
+        if changes[change]:
+            print(f"{change.capitalize()} {', '.join(changes[change])}")
+    print(f"{len(changes['unchanged'])} months unchanged")
+
+    version = data_version(args.manifest)
+    metadata = read_export_metadata(args.export)
+    if metadata is None or metadata['data_version'] != version:
+        metadata = write_export(
+            load_trips(args.manifest, args.raw_dir), load_station_coordinates(args.coordinates), version, args.export
+        )
+        print(f"Wrote {metadata['size']} byte export to {args.export} (sha256 {metadata['sha256']})")
+
+    # Imported here because the snapshot is built from this module's output
+    from permalinks import write_app_warm_state
+    from snapshot import snapshot_version, write_snapshot
+
+    snapshot_dir = os.path.join(os.path.dirname(args.manifest), 'snapshot')
+    if not os.path.exists(os.path.join(snapshot_dir, snapshot_version(args.manifest, args.coordinates))):
+        version = write_snapshot(snapshot_dir, args.manifest, args.raw_dir, coordinates_path=args.coordinates)
+        print(f"Wrote snapshot {version} to {snapshot_dir}")
+
+    # The app loads the default data, so only its snapshot gets the default
+    # views computed into a warm state, unless it already has them for this code
+    defaults = [(args.manifest, MANIFEST_PATH), (args.coordinates, COORDINATES_PATH)]
+    if all(os.path.abspath(path) == os.path.abspath(default) for path, default in defaults):
+        write_app_warm_state(refresh=False)
+
+
+if __name__ == '__main__':
+    main()
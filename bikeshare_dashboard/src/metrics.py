@@ -0,0 +1,313 @@
+"""
+Latency, payload size and error metrics for the dashboard callbacks.
+
+Every Dash callback (and the Flask routes that stand in for callbacks, such
+as the map and the downloads) can be wrapped to record how long it took, how
+many bytes it returned and whether it raised. The counts are aggregated into
+histograms and rendered in the Prometheus text format for a ``/metrics``
+route, along with the hit rates of the result caches. Each gunicorn worker
+keeps its own metrics.
+
+Background callbacks only dispatch a job and poll for its result, so the work
+done in the job processes is recorded by ``JobMetrics``, which keeps its
+counts on disk where every worker's jobs add to them.
+"""
+
+import bisect
+import copy
+import logging
+import threading
+import time
+
+import diskcache
+from dash.exceptions import PreventUpdate
+from flask import request
+
+slow_logger = logging.getLogger('slow_callbacks')
+
+# Upper bounds of the histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1e3, 1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 1e7)
+
+# Longest repr of a callback's inputs written to the slow-callback log
+MAX_LOGGED_INPUTS = 1000
+
+
+class Histogram:
+    """
+    Cumulative histogram of observed values, in the Prometheus sense.
+
+    Args:
+        buckets (tuple): Sorted upper bounds of the buckets.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """Add one observation."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def cumulative_counts(self):
+        """Return ``(upper bound, count)`` pairs, ending with ``'+Inf'``."""
+        running = 0
+        pairs = []
+        for bound, count in zip(list(self.buckets) + ['+Inf'], self.counts):
+            running += count
+            pairs.append((bound, running))
+        return pairs
+
+
+class CallbackMetrics:
+    """
+    Thread-safe collection of per-callback latency, size and outcome metrics.
+
+    Args:
+        slow_seconds (float): Calls taking at least this long are logged with
+            their inputs to the ``slow_callbacks`` logger; ``None`` disables the log.
+    """
+
+    # Prefix of the metric names, name of the label of each series and the
+    # help text of each metric
+    prefix = 'dash_callback'
+    label = 'callback'
+    help = {
+        'duration_seconds': "Time spent in each callback, including serialising its response.",
+        'response_bytes': "Size of each callback's response.",
+        'calls_total': "Callback calls by outcome (ok, prevented or error).",
+    }
+
+    def __init__(self, slow_seconds=None):
+        self.slow_seconds = slow_seconds
+        self.latency = {}
+        self.size = {}
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds, size, outcome):
+        """
+        Record one call of a callback.
+
+        Args:
+            name (str): The callback name.
+            seconds (float): Time the call took.
+            size (int): Bytes returned, or ``None`` if unknown (e.g. on errors).
+            outcome (str): ``'ok'``, ``'prevented'`` (PreventUpdate) or ``'error'``.
+        """
+        with self._lock:
+            if name not in self.latency:
+                self.latency[name] = Histogram(LATENCY_BUCKETS)
+                self.size[name] = Histogram(SIZE_BUCKETS)
+            self.latency[name].observe(seconds)
+            if size is not None:
+                self.size[name].observe(size)
+            self.calls[(name, outcome)] = self.calls.get((name, outcome), 0) + 1
+
+    def instrument(self, name, func, sizeof=len, describe_inputs=None):
+        """
+        Wrap a function so every call is recorded under ``name``.
+
+        Args:
+            name (str): The callback name used as the metric label.
+            func (callable): The callback to wrap.
+            sizeof (callable): Returns the size in bytes of a result, or ``None``.
+            describe_inputs (callable): Returns the inputs to write to the
+                slow-callback log; the call's positional arguments by default.
+
+        Returns:
+            callable: The wrapped function.
+        """
+        def instrumented(*args, **kwargs):
+            start = time.perf_counter()
+            size = None
+            outcome = 'error'
+            try:
+                result = func(*args, **kwargs)
+                size = sizeof(result)
+                outcome = 'ok'
+                return result
+            except PreventUpdate:
+                outcome = 'prevented'
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                self.observe(name, elapsed, size, outcome)
+                if self.slow_seconds is not None and elapsed >= self.slow_seconds:
+                    slow_logger.warning(
+                        "%s took %.3f s (%s, %s bytes) with inputs %s",
+                        name, elapsed, outcome, size,
+                        repr(describe_inputs() if describe_inputs else args)[:MAX_LOGGED_INPUTS]
+                    )
+
+        instrumented.__name__ = getattr(func, '__name__', name)
+        instrumented.__doc__ = getattr(func, '__doc__', None)
+        instrumented.__wrapped__ = func
+        instrumented.instrumented = True
+        return instrumented
+
+    def render(self):
+        """
+        Render the metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: The ``/metrics`` response body.
+        """
+        latency, size, calls = self._snapshot()
+        lines = _histogram_lines(
+            f'{self.prefix}_duration_seconds',
+            self.help['duration_seconds'],
+            self.label,
+            latency
+        )
+        lines += _histogram_lines(
+            f'{self.prefix}_response_bytes',
+            self.help['response_bytes'],
+            self.label,
+            size
+        )
+        lines.append(f"# HELP {self.prefix}_calls_total {self.help['calls_total']}")
+        lines.append(f"# TYPE {self.prefix}_calls_total counter")
+        for (name, outcome), count in sorted(calls.items()):
+            lines.append(f'{self.prefix}_calls_total{{{self.label}="{_escape(name)}",outcome="{outcome}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def _snapshot(self):
+        """Return copies of the latency and size histograms and the call counts."""
+        with self._lock:
+            return copy.deepcopy((self.latency, self.size, self.calls))
+
+
+class JobMetrics(CallbackMetrics):
+    """
+    Metrics of the work done in background jobs, kept in a ``diskcache`` directory.
+
+    Jobs run in processes of their own, which exit without returning anything
+    to the worker that started them, so each call is added to the counts on
+    disk instead. Every worker reads (and reports) the same counts.
+
+    Args:
+        directory (str): Directory of the on-disk counts.
+        slow_seconds (float): As for ``CallbackMetrics``.
+    """
+
+    prefix = 'dash_job'
+    label = 'job'
+    help = {
+        'duration_seconds': "Time spent in each step of the background jobs, in the job processes.",
+        'response_bytes': "Size of the result of each step of the background jobs.",
+        'calls_total': "Background job steps by outcome (ok, prevented or error).",
+    }
+
+    def __init__(self, directory, slow_seconds=None):
+        super().__init__(slow_seconds)
+        self.store = diskcache.Cache(directory)
+
+    def observe(self, name, seconds, size, outcome):
+        """Record one call of a job, as ``CallbackMetrics.observe``."""
+        with self.store.transact():
+            latency, sizes, calls = self.store.get('metrics', ({}, {}, {}))
+            if name not in latency:
+                latency[name] = Histogram(LATENCY_BUCKETS)
+                sizes[name] = Histogram(SIZE_BUCKETS)
+            latency[name].observe(seconds)
+            if size is not None:
+                sizes[name].observe(size)
+            calls[(name, outcome)] = calls.get((name, outcome), 0) + 1
+            self.store.set('metrics', (latency, sizes, calls))
+
+    def _snapshot(self):
+        """Return the latency and size histograms and the call counts on disk."""
+        return self.store.get('metrics', ({}, {}, {}))
+
+
+def instrument_callbacks(dash_app, metrics):
+    """
+    Wrap every callback registered on a Dash app with ``metrics``.
+
+    Dash stores the function it dispatches to, which already returns the
+    serialised JSON response, in ``callback_map``; wrapping that function
+    measures serialisation too and the exact number of bytes sent.
+
+    Args:
+        dash_app (dash.Dash): The app, after all its callbacks are registered.
+        metrics (CallbackMetrics): Where to record the calls.
+    """
+    for entry in dash_app.callback_map.values():
+        callback = entry['callback']
+        if not getattr(callback, 'instrumented', False):
+            entry['callback'] = metrics.instrument(callback.__name__, callback)
+
+
+def instrument_routes(server, metrics, endpoints):
+    """
+    Wrap Flask view functions with ``metrics``, labelled by endpoint name.
+
+    Args:
+        server (flask.Flask): The Flask server.
+        metrics (CallbackMetrics): Where to record the calls.
+        endpoints (list): Names of the view functions to wrap.
+    """
+    for endpoint in endpoints:
+        server.view_functions[endpoint] = metrics.instrument(
+            endpoint, server.view_functions[endpoint], _response_size, lambda: request.args.to_dict(flat=False)
+        )
+
+
+def render_cache_stats(caches):
+    """
+    Render the counters of result caches in the Prometheus text format.
+
+    Args:
+        caches (dict): ``LRUCache`` and ``SharedCache`` objects keyed by cache name.
+
+    Returns:
+        str: The cache metrics, to append to the ``/metrics`` response.
+    """
+    stats = {name: cache.stats() for name, cache in sorted(caches.items())}
+    series = [
+        ('dash_cache_hits_total', 'counter', 'hits', "Lookups answered from the cache."),
+        ('dash_cache_misses_total', 'counter', 'misses', "Lookups that had to compute the result."),
+        ('dash_cache_evictions_total', 'counter', 'evictions', "Entries evicted to stay within the cache bounds."),
+        ('dash_cache_expirations_total', 'counter', 'expirations', "Entries dropped for being older than the TTL."),
+        ('dash_cache_coalesced_total', 'counter', 'coalesced', "Misses that waited for the same computation in progress."),
+        ('dash_cache_errors_total', 'counter', 'errors', "Lookups or writes that failed in the shared cache backend."),
+        ('dash_cache_entries', 'gauge', 'entries', "Entries currently cached."),
+        ('dash_cache_bytes', 'gauge', 'bytes', "Estimated size of the cached entries."),
+    ]
+
+    lines = []
+    for metric, kind, field, help_text in series:
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for name, values in stats.items():
+            # The shared cache only reports its lookups
+            if field in values:
+                lines.append(f'{metric}{{cache="{_escape(name)}"}} {values[field]}')
+    return '\n'.join(lines) + '\n'
+
+
+def _response_size(response):
+    """Size of a Flask response body, or ``None`` if it is streamed."""
+    return response.content_length
+
+
+def _histogram_lines(metric, help_text, label_name, histograms):
+    """Render one histogram metric with a series per callback (or job)."""
+    lines = [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+    for name, histogram in sorted(histograms.items()):
+        label = f'{label_name}="{_escape(name)}"'
+        for bound, count in histogram.cumulative_counts():
+            lines.append(f'{metric}_bucket{{{label},le="{bound}"}} {count}')
+        lines.append(f'{metric}_sum{{{label}}} {histogram.total}')
+        lines.append(f'{metric}_count{{{label}}} {histogram.count}')
+    return lines
+
+
+def _escape(value):
+    """Escape a Prometheus label value."""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
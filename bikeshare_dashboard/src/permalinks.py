@@ -0,0 +1,282 @@
+"""
+Permalinks to the filter state of the Trends and Map tabs.
+
+As filters change, the dashboard writes the selected view to the address bar:
+
+* ``/trends/<view>?selected_bike=..&selected_membership=..&selected_view=..&selected_season=..``
+* ``/map/<plot type>?bike_type=..&freq_type=..&plot_type=..&map_month_range=..``
+
+List values are repeated parameters (``selected_season=0&selected_season=3``);
+the Python list literals of earlier links (``selected_season=[0, 3]``) are
+still read. Opening a permalink restores the filters and the tab, and counts
+a visit in a ``VisitLog``, so the most visited views can be pre-rendered into
+the app's warm state:
+
+    python permalinks.py --top 20
+
+Workers load the warm state when they start, so running workers keep their
+pre-rendered views until they are restarted (e.g. ``kill -HUP`` to gunicorn).
+"""
+
+import argparse
+import ast
+import logging
+import os
+import sqlite3
+import subprocess
+import sys
+from contextlib import closing
+from urllib.parse import parse_qs, quote, unquote, urlencode
+
+logger = logging.getLogger(__name__)
+
+BIKE_TYPES = ('electric', 'classic', 'both')
+TRENDS_VIEWS = ('departure count', 'covered distance')
+PLOT_TYPES = ('marker plot', 'density plot')
+FREQ_TYPES = ('all', 'top5', 'top10', 'top20')
+
+# Values of the Trends membership dropdown; 'all' selects every membership
+MEMBERSHIP_TYPES = (
+    'all', '24 Hour', '30 Day Pass', '365 Corporate Plus', '365 Corporate Plus Renewal',
+    '365 Corporate Standard', '365 Corporate Standard Renewal', '365 Day Founding Plus',
+    '365 Day Founding Standard', '365 Day Pass Plus', '365 Day Pass Plus SALE',
+    '365 Day Pass Standard', '365 Day Pass Standard SALE', 'Archived Monthly Plus',
+    'Archived Monthly Standard', 'Community Pass', 'Community Pass E-bike',
+    'Community Pass E-bike (PWD)', 'Herbaland Pass', 'Limited Classic Bikes Only (60 min)',
+    'Pay Per Ride', 'UBC Inclusive Corporate Pass', 'VIP',
+)
+
+# Indices of the last season and month of the range sliders
+LAST_SEASON = 3
+LAST_MONTH = 11
+
+
+def trends_permalink(selected_bike, selected_membership, selected_view, selected_season):
+    """
+    Build the permalink of a Trends filter selection.
+
+    Args:
+        selected_bike (str): Selected bike type ('electric', 'classic', or 'both').
+        selected_membership (list): Selected membership types, in any order.
+        selected_view (str): Selected view ('departure count' or 'covered distance').
+        selected_season (list): First and last selected season (0 is Winter).
+
+    Returns:
+        tuple: The pathname and search (with its ``?``) of the permalink.
+    """
+    # Memberships are written sorted, as parse_permalink reads them, so a
+    # permalink opens with the dropdown as it is
+    query = [('selected_bike', selected_bike)]
+    query += [('selected_membership', membership) for membership in sorted(set(selected_membership))]
+    query += [('selected_view', selected_view)]
+    query += [('selected_season', int(season)) for season in selected_season]
+    return f"/trends/{quote(selected_view)}", f"?{urlencode(query)}"
+
+
+def map_permalink(map_month_range, bike_type, plot_type, freq_type):
+    """
+    Build the permalink of a Map filter selection.
+
+    Args:
+        map_month_range (list): First and last selected month (0 is January).
+        bike_type (str): Selected bike type ('electric', 'classic', or 'both').
+        plot_type (str): Selected plot type ('marker plot' or 'density plot').
+        freq_type (str): Selected frequency type ('all', 'top5', 'top10', or 'top20').
+
+    Returns:
+        tuple: The pathname and search (with its ``?``) of the permalink.
+    """
+    query = [('bike_type', bike_type), ('freq_type', freq_type), ('plot_type', plot_type)]
+    query += [('map_month_range', int(month)) for month in map_month_range]
+    return f"/map/{quote(plot_type)}", f"?{urlencode(query)}"
+
+
+def parse_permalink(pathname, search):
+    """
+    Read the filter selection of a permalink.
+
+    Args:
+        pathname (str): The pathname of the page, possibly under a path prefix.
+        search (str): The query string of the page, with or without its ``?``.
+
+    Returns:
+        tuple: ``('trends', args)`` or ``('map', args)``, where ``args`` are the
+            arguments of ``update_trends`` (with the memberships sorted) or
+            ``update_map`` (without its progress callback), or ``None`` if the
+            page is not a valid permalink, e.g. one with a value the filters do
+            not offer.
+    """
+    segments = unquote(pathname or '').rstrip('/').split('/')
+    if len(segments) < 2 or segments[-2] not in ('trends', 'map'):
+        return None
+    query = parse_qs((search or '').lstrip('?'))
+
+    try:
+        if segments[-2] == 'trends':
+            selected_view = _value(query, 'selected_view', segments[-1])
+            selected_bike = _value(query, 'selected_bike')
+            selected_membership = _values(query, 'selected_membership')
+            selected_season = [int(season) for season in _values(query, 'selected_season')]
+
+            if selected_view not in TRENDS_VIEWS or selected_bike not in BIKE_TYPES:
+                return None
+            if not selected_membership or not all(m in MEMBERSHIP_TYPES for m in selected_membership):
+                return None
+            if not _is_range(selected_season, LAST_SEASON):
+                return None
+
+            # Membership order does not change the view, so one order is kept
+            # (as in the callbacks' cache keys) and each view has one permalink
+            selected_membership = sorted(set(selected_membership))
+            return 'trends', (selected_bike, selected_membership, selected_view, selected_season)
+
+        plot_type = _value(query, 'plot_type', segments[-1])
+        bike_type = _value(query, 'bike_type')
+        freq_type = _value(query, 'freq_type')
+        map_month_range = [int(month) for month in _values(query, 'map_month_range')]
+
+        if plot_type not in PLOT_TYPES or bike_type not in BIKE_TYPES or freq_type not in FREQ_TYPES:
+            return None
+        if not _is_range(map_month_range, LAST_MONTH):
+            return None
+        return 'map', (map_month_range, bike_type, plot_type, freq_type)
+    except (TypeError, ValueError, SyntaxError, RecursionError):
+        return None
+
+
+def canonical_permalink(kind, args):
+    """
+    Build the one URL of a filter selection, however its permalink was written.
+
+    Args:
+        kind (str): ``'trends'`` or ``'map'``.
+        args (tuple): The selection, as returned by ``parse_permalink``.
+
+    Returns:
+        str: The pathname and search of the permalink.
+    """
+    pathname, search = (trends_permalink if kind == 'trends' else map_permalink)(*args)
+    return pathname + search
+
+
+def _value(query, name, default=None):
+    """Return the last value of a query parameter, or ``default``."""
+    return query[name][-1] if name in query else default
+
+
+def _values(query, name):
+    """Return the values of a repeated query parameter, or of a list literal."""
+    values = query.get(name, [])
+    if len(values) == 1 and values[0].startswith('['):
+        literal = ast.literal_eval(values[0])
+        if not isinstance(literal, list):
+            raise ValueError(f"Invalid list {values[0]!r}")
+        return literal
+    return values
+
+
+def _is_range(values, last):
+    """Whether ``values`` is a first and last index within ``0..last``."""
+    return len(values) == 2 and 0 <= values[0] <= values[1] <= last
+
+
+class VisitLog:
+    """
+    Count of the visits of each permalink, in a SQLite file shared by the workers.
+
+    Failing to count a visit is logged and does not stop the permalink from
+    opening.
+
+    Args:
+        path (str): Location of the database file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _connect(self):
+        """Open a connection, creating the file and its table on first use."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=5)
+        connection.execute("CREATE TABLE IF NOT EXISTS visits (url TEXT PRIMARY KEY, count INTEGER NOT NULL)")
+        return connection
+
+    def record(self, url):
+        """Count one visit of ``url``."""
+        try:
+            with closing(self._connect()) as connection, connection:
+                connection.execute(
+                    "INSERT INTO visits (url, count) VALUES (?, 1) "
+                    "ON CONFLICT (url) DO UPDATE SET count = count + 1",
+                    (url,)
+                )
+        except (OSError, sqlite3.Error):
+            logger.warning("Counting a visit of %s failed", url, exc_info=True)
+
+    def top(self, n):
+        """
+        Return the most visited permalinks.
+
+        Args:
+            n (int): How many to return.
+
+        Returns:
+            list: ``(url, visits)`` pairs, most visited first.
+        """
+        if not os.path.exists(self.path):
+            return []
+        with closing(self._connect()) as connection:
+            return connection.execute(
+                "SELECT url, count FROM visits ORDER BY count DESC, url LIMIT ?", (n,)
+            ).fetchall()
+
+
+def write_app_warm_state(refresh=True):
+    """
+    Build the app's warm state in a child process, so the caller (e.g. the
+    ingest script) does not load the app and its data itself.
+
+    Args:
+        refresh (bool): Rebuild it from the latest visit counts even if the app
+            already has a warm state for its code and data.
+
+    Raises:
+        subprocess.CalledProcessError: If building the warm state failed.
+    """
+    command = [sys.executable, os.path.abspath(__file__)]
+    if not refresh:
+        command.append('--if-missing')
+    subprocess.run(command, check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-render the most visited permalinks into the app's warm state.")
+    parser.add_argument('--top', type=int, default=None, help="number of permalinks to pre-render (default PRERENDER_PERMALINKS or 20)")
+    parser.add_argument('--if-missing', action='store_true', help="only build the warm state if the app has none for its code and data")
+    args = parser.parse_args()
+
+    if args.top is not None:
+        os.environ['PRERENDER_PERMALINKS'] = str(args.top)
+
+    # Imported here because importing the app loads the data, and builds the
+    # warm state if it is missing
+    import app
+    from snapshot import warm_state_lock, write_warm_state
+
+    if app.warm_state_dir is None:
+        parser.error("the app has no warm state when DATA_START_DATE or DATA_END_DATE is set")
+    if args.if_missing:
+        print(f"Warm state for code version {app.CODE_VERSION} is in {app.warm_state_dir}")
+        return
+
+    with warm_state_lock(app.warm_state_dir):
+        state = app.build_warm_state()
+        write_warm_state(app.warm_state_dir, app.CODE_VERSION, state)
+    for url, visits in state['permalinks']:
+        print(f"Pre-rendered {url} ({visits} visits)")
+    print(f"Warm state for code version {app.CODE_VERSION} is in {app.warm_state_dir}")
+    print("Running workers load it when they restart (e.g. kill -HUP the gunicorn master)")
+
+
+if __name__ == '__main__':
+    main()
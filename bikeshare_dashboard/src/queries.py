@@ -0,0 +1,98 @@
+"""
+Selections over the processed trip table shared by the dashboard callbacks.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def sort_by_departure(df):
+    """
+    Return the trip table ordered by departure time, sorting only if needed.
+
+    Trips without a departure time are placed last, which is also where numpy
+    orders NaT, so binary searches over the column stay valid.
+
+    Args:
+        df (pandas.DataFrame): The trip table.
+
+    Returns:
+        pandas.DataFrame: The trip table sorted by ``Departure``.
+    """
+    departure = df['Departure']
+    valid = departure.notna().sum()
+    if departure.iloc[:valid].is_monotonic_increasing and departure.iloc[valid:].isna().all():
+        return df
+
+    return df.sort_values('Departure', kind='stable', na_position='last', ignore_index=True)
+
+
+def date_range_bounds(df, start_date, end_date):
+    """
+    Find the positional bounds of the trips departing within a date range.
+
+    ``df`` must be sorted by ``Departure`` (see ``sort_by_departure``). The
+    range covers whole days, from the start of ``start_date`` to the end of
+    ``end_date``, as picked on the ``calendar`` DatePickerRange.
+
+    Args:
+        df (pandas.DataFrame): The trip table, sorted by departure time.
+        start_date (str): The first day of the range, e.g. ``'2023-01-01'``.
+        end_date (str): The last day of the range, e.g. ``'2023-12-31'``.
+
+    Returns:
+        tuple: The ``(start, stop)`` row positions of the selected trips.
+    """
+    departure = df['Departure'].values
+    start = np.searchsorted(departure, pd.Timestamp(start_date).normalize().to_datetime64(), side='left')
+    end_of_range = pd.Timestamp(end_date).normalize() + pd.Timedelta(days=1)
+    stop = np.searchsorted(departure, end_of_range.to_datetime64(), side='left')
+
+    return start, max(start, stop)
+
+
+def select_date_range(df, start_date, end_date):
+    """
+    Select the trips departing within a date range with a binary search.
+
+    Args:
+        df (pandas.DataFrame): The trip table, sorted by departure time.
+        start_date (str): The first day of the range, e.g. ``'2023-01-01'``.
+        end_date (str): The last day of the range, e.g. ``'2023-12-31'``.
+
+    Returns:
+        pandas.DataFrame: A positional slice of ``df`` holding the selected trips.
+    """
+    start, stop = date_range_bounds(df, start_date, end_date)
+
+    return df.iloc[start:stop]
+
+
+def filter_trips(df, start_date, end_date, bike_type='both', memberships=('all',)):
+    """
+    Select the trips matching the dashboard filters.
+
+    The date range is narrowed with a binary search first, so the bike and
+    membership masks are only evaluated over the trips in range.
+
+    Args:
+        df (pandas.DataFrame): The trip table, sorted by departure time.
+        start_date (str): The first day of the range, e.g. ``'2023-01-01'``.
+        end_date (str): The last day of the range, e.g. ``'2023-12-31'``.
+        bike_type (str): Selected bike type ('electric', 'classic', or 'both').
+        memberships (list): Selected membership types, or ``['all']``.
+
+    Returns:
+        pandas.DataFrame: The selected trips, in departure order.
+    """
+    selected = select_date_range(df, start_date, end_date)
+
+    mask = np.ones(len(selected), dtype=bool)
+    if bike_type == 'electric':
+        mask &= selected['Electric bike'].values
+    elif bike_type == 'classic':
+        mask &= ~selected['Electric bike'].values
+    if 'all' not in memberships:
+        mask &= selected['Membership type'].isin(list(memberships)).values
+
+    return selected if mask.all() else selected[mask]
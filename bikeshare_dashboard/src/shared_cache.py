@@ -0,0 +1,390 @@
+"""
+Result cache shared by every gunicorn worker.
+
+The per-worker caches in ``cache.py`` start cold in each worker and after each
+worker restart, so the same popular views are computed once per worker. A
+``SharedCache`` sits behind them and stores pickled results in a backend all
+workers reach:
+
+* ``SQLiteBackend``, a SQLite file on local disk (``sqlite:////abs/path/to/file``;
+  as in SQLAlchemy, a path after only three slashes is relative to the working
+  directory), for workers on one machine, and
+* ``RedisBackend``, any server speaking the Redis protocol (``redis://host:port/0``),
+  for workers on several machines. It needs the ``redis`` package.
+
+Keys start with the version of the data and code the results are computed
+with, so ingesting new data or deploying new code switches every worker to a
+fresh key space at once; results of older versions are never read again
+and age out of the backend (least recently used first for SQLite, by TTL or
+the server's eviction policy for Redis).
+
+While a worker computes a missing result it holds a lock in the backend, and
+other workers missing the same result wait for it instead of computing it too.
+
+Results are pickled, so the backend must only be writable by the dashboard.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Seconds a SQLite value's last read time may lag behind, so that most reads
+# do not write (and take the database's write lock)
+ACCESS_RESOLUTION = 60
+
+
+class SQLiteBackend:
+    """
+    Key-value store in a SQLite file, bounded by the total size of its values.
+
+    Each process opens its own connections (one per thread), and the file
+    uses write-ahead logging so readers in other workers are not blocked by
+    a write. Reads only update a value's last read time once it is more than
+    ``ACCESS_RESOLUTION`` seconds old, so recency is approximate and hot
+    values are read without writing.
+
+    Args:
+        path (str): Location of the database file.
+        max_bytes (int): Total size of the values above which the least
+            recently read ones are deleted.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._tokens = {}
+
+    def _connection(self):
+        """Return this thread's connection, opening it after a fork or on first use."""
+        if getattr(self._local, 'pid', None) != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+            # Locks are short-lived, so a table from before locks had owners is simply replaced
+            columns = [row[1] for row in connection.execute("PRAGMA table_info(locks)")]
+            if columns and 'token' not in columns:
+                connection.execute("DROP TABLE locks")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS locks (key TEXT PRIMARY KEY, token TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def get(self, key):
+        """Return the value stored under ``key``, or ``None``."""
+        connection = self._connection()
+        row = connection.execute("SELECT value, accessed FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[1] > ACCESS_RESOLUTION:
+            connection.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def delete(self, key):
+        """Delete the value stored under ``key``, if any."""
+        self._connection().execute("DELETE FROM results WHERE key = ?", (key,))
+
+    def clear(self, prefix):
+        """Delete every value whose key starts with ``prefix``."""
+        self._connection().execute("DELETE FROM results WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+
+    def set(self, key, value):
+        """Store ``value`` under ``key``, deleting old values to stay within ``max_bytes``."""
+        if len(value) > self.max_bytes:
+            return
+
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(
+                "INSERT OR REPLACE INTO results (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time())
+            )
+            excess = connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0] - self.max_bytes
+            if excess > 0:
+                stale = []
+                for stale_key, size in connection.execute("SELECT key, size FROM results ORDER BY accessed"):
+                    if excess <= 0:
+                        break
+                    stale.append((stale_key,))
+                    excess -= size
+                connection.executemany("DELETE FROM results WHERE key = ?", stale)
+
+    def acquire(self, key, seconds):
+        """Take the lock ``key`` for at most ``seconds``; return whether it was free."""
+        connection = self._connection()
+        token = uuid.uuid4().hex
+        now = time.time()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("DELETE FROM locks WHERE key = ? AND expires < ?", (key, now))
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO locks (key, token, expires) VALUES (?, ?, ?)", (key, token, now + seconds)
+            )
+        if cursor.rowcount == 1:
+            self._tokens[key] = token
+            return True
+        return False
+
+    def release(self, key):
+        """Release the lock ``key`` unless it expired and another worker took it."""
+        token = self._tokens.pop(key, None)
+        if token is not None:
+            self._connection().execute("DELETE FROM locks WHERE key = ? AND token = ?", (key, token))
+
+
+class RedisBackend:
+    """
+    Key-value store on a server speaking the Redis protocol.
+
+    Args:
+        url (str): Server URL, e.g. ``redis://localhost:6379/0``.
+        ttl (int): Seconds each value is kept, or ``None`` to leave expiry to
+            the server's eviction policy.
+    """
+
+    def __init__(self, url, ttl=None):
+        # redis is only needed when the shared cache is on a Redis server
+        import redis
+
+        self.client = redis.Redis.from_url(url, socket_timeout=5, socket_connect_timeout=5)
+        self.ttl = ttl
+        self._tokens = {}
+
+    def get(self, key):
+        """Return the value stored under ``key``, or ``None``."""
+        return self.client.get(key)
+
+    def set(self, key, value):
+        """Store ``value`` under ``key``."""
+        self.client.set(key, value, ex=self.ttl)
+
+    def delete(self, key):
+        """Delete the value stored under ``key``, if any."""
+        self.client.delete(key)
+
+    def clear(self, prefix):
+        """Delete every value whose key starts with ``prefix``."""
+        for key in self.client.scan_iter(match=f"{prefix}*"):
+            self.client.delete(key)
+
+    def acquire(self, key, seconds):
+        """Take the lock ``key`` for at most ``seconds``; return whether it was free."""
+        token = uuid.uuid4().hex
+        if self.client.set(key, token, nx=True, px=int(seconds * 1000)):
+            self._tokens[key] = token
+            return True
+        return False
+
+    def release(self, key):
+        """Release the lock ``key`` unless it expired and another worker took it."""
+        token = self._tokens.pop(key, None)
+        if token is not None and self.client.get(key) == token.encode():
+            self.client.delete(key)
+
+
+class SharedCache:
+    """
+    Pickled results in a shared backend, namespaced by data and code version.
+
+    Backend errors are logged and treated as misses, so the dashboard keeps
+    working, computing results locally, if the backend is unavailable. So are
+    stored results that cannot be unpickled (e.g. truncated, or written with
+    other library versions), which are deleted and computed again.
+
+    Args:
+        backend (SQLiteBackend or RedisBackend): Where the results are stored.
+        prefix (str): Prefix of every key, to share a backend between apps.
+        lock_seconds (float): Longest time a worker waits for another worker
+            computing the same result before computing it itself.
+    """
+
+    def __init__(self, backend, prefix='cyclesync', lock_seconds=30):
+        self.backend = backend
+        self.prefix = prefix
+        self.lock_seconds = lock_seconds
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def key(self, version, name, key):
+        """
+        Build the backend key of a result.
+
+        Args:
+            version (str): The data and code version the result is computed with.
+            name (str): The name of the function computing it.
+            key (tuple): The function's canonical cache key.
+
+        Returns:
+            str: The key, made of the prefix, version, name and a digest of ``key``.
+        """
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return f"{self.prefix}:{version}:{name}:{digest}"
+
+    def get_or_compute(self, version, name, key, compute):
+        """
+        Return the shared result for ``key``, computing and storing it on a miss.
+
+        On a miss the result is computed under a lock in the backend; if
+        another worker holds it, this one waits for that worker's result.
+
+        Args:
+            version (str): The data and code version the result is computed with.
+            name (str): The name of the function computing it.
+            key (tuple): The function's canonical cache key.
+            compute (callable): Computes the result.
+
+        Returns:
+            The result.
+        """
+        backend_key = self.key(version, name, key)
+        try:
+            payload = self.backend.get(backend_key)
+        except Exception:
+            logger.warning("Shared cache read of %s failed", backend_key, exc_info=True)
+            self._count('errors')
+            return compute()
+
+        if payload is not None:
+            found, value = self._load(backend_key, payload)
+            if found:
+                self._count('hits')
+                return value
+
+        self._count('misses')
+        lock_key = f"{backend_key}:lock"
+        try:
+            locked = self.backend.acquire(lock_key, self.lock_seconds)
+        except Exception:
+            logger.warning("Shared cache lock of %s failed", backend_key, exc_info=True)
+            self._count('errors')
+            return compute()
+
+        if not locked:
+            payload = self._wait(backend_key)
+            if payload is not None:
+                found, value = self._load(backend_key, payload)
+                if found:
+                    self._count('coalesced')
+                    return value
+            return self._compute_and_set(backend_key, compute)
+
+        try:
+            return self._compute_and_set(backend_key, compute)
+        finally:
+            try:
+                self.backend.release(lock_key)
+            except Exception:
+                logger.warning("Shared cache unlock of %s failed", backend_key, exc_info=True)
+                self._count('errors')
+
+    def clear(self):
+        """Delete every result stored under this cache's prefix, in every version."""
+        self.backend.clear(f"{self.prefix}:")
+
+    def _load(self, backend_key, payload):
+        """Unpickle a stored result, deleting it if it cannot be; return ``(found, value)``."""
+        try:
+            return True, pickle.loads(payload)
+        except Exception:
+            logger.warning("Shared cache entry %s cannot be read, recomputing it", backend_key, exc_info=True)
+            self._count('errors')
+        try:
+            self.backend.delete(backend_key)
+        except Exception:
+            logger.warning("Shared cache delete of %s failed", backend_key, exc_info=True)
+            self._count('errors')
+        return False, None
+
+    def _compute_and_set(self, backend_key, compute):
+        """Compute a result and store it, logging a failed write."""
+        value = compute()
+        try:
+            self.backend.set(backend_key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            logger.warning("Shared cache write of %s failed", backend_key, exc_info=True)
+            self._count('errors')
+        return value
+
+    def _wait(self, backend_key):
+        """Poll for a result another worker is computing, up to ``lock_seconds``."""
+        deadline = time.monotonic() + self.lock_seconds
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            try:
+                payload = self.backend.get(backend_key)
+            except Exception:
+                logger.warning("Shared cache read of %s failed", backend_key, exc_info=True)
+                self._count('errors')
+                return None
+            if payload is not None:
+                return payload
+        return None
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        """
+        Report the lookups of this worker.
+
+        Returns:
+            dict: Hits, misses, misses that waited for another worker's
+                result, backend errors and hit rate.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'errors': self.errors,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+def shared_cache_from_url(url, max_bytes=256 * 1024 * 1024, ttl=None, lock_seconds=30):
+    """
+    Create the shared cache described by a URL.
+
+    Args:
+        url (str): ``sqlite:////abs/path/to/file`` (``sqlite:///rel/path``
+            for a path relative to the working directory) or
+            ``redis://host:port/db`` (``rediss://`` and ``unix://`` also
+            work), or empty for no shared cache.
+        max_bytes (int): Size bound of a SQLite backend.
+        ttl (int): Expiry in seconds of values in a Redis backend.
+        lock_seconds (float): Longest wait for another worker's computation.
+
+    Returns:
+        SharedCache: The cache, or ``None`` if ``url`` is empty.
+
+    Raises:
+        ValueError: If the URL scheme is not supported.
+    """
+    if not url:
+        return None
+    if url.startswith('sqlite:///'):
+        return SharedCache(SQLiteBackend(url[len('sqlite:///'):], max_bytes=max_bytes), lock_seconds=lock_seconds)
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return SharedCache(RedisBackend(url, ttl=ttl), lock_seconds=lock_seconds)
+    raise ValueError(f"Unsupported shared cache URL {url!r}")
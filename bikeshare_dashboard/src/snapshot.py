@@ -0,0 +1,401 @@
+"""
+Memory-mapped snapshot of the dashboard's trip table and aggregates.
+
+Every gunicorn worker used to build its own copy of ``combined_df`` and of the
+aggregates derived from it, so memory grew with the worker count. The
+snapshot stores them once on disk, in a layout numpy can view without
+copying:
+
+* the trip table as an Arrow IPC file whose columns are plain fixed-width
+  arrays (timestamps as int64, booleans as uint8, categoricals as their
+  codes with the categories in the schema metadata), and
+* each aggregate's arrays as ``.npy`` files.
+
+Workers memory-map these files, so the columns and aggregate arrays are
+read-only views over the same page-cache pages in every process, and a new
+worker starts without parsing or aggregating anything.
+
+Next to them, a warm state holds what the app derives from the data for its
+first page (the placeholder cards and figures, the default view of every
+tab and the views of the most visited permalinks), pickled per version of the
+app's code, so workers load it instead of computing it.
+"""
+
+import fcntl
+import glob
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+from contextlib import contextmanager
+from importlib import metadata
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from aggregates import DailyAggregates, StationActivity, TripCube
+from ingest import (
+    COORDINATES_PATH, MANIFEST_PATH, PROCESSED_DIR, RAW_DIR, align_stations, data_version, ensure_ingested,
+    file_checksum, load_station_coordinates, load_trips, log_memory_usage
+)
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = os.path.join(PROCESSED_DIR, 'snapshot')
+
+# Schema metadata key holding how each column is rebuilt from its array
+COLUMNS_KEY = b'dashboard_columns'
+
+WARM_STATE_FILE = 'warm_state.pkl'
+
+# Libraries whose objects are pickled in the warm state or shape its contents
+VERSIONED_PACKAGES = ('dash', 'folium', 'pandas', 'plotly')
+
+
+def dashboard_trips(df):
+    """
+    Keep the trips the dashboard shows: those with a departure and return station.
+
+    Args:
+        df (pandas.DataFrame): The processed trip table.
+
+    Returns:
+        pandas.DataFrame: The trips with both stations, in departure order.
+    """
+    return df.dropna(subset=['Departure station', 'Return station']).reset_index(drop=True)
+
+
+def build_aggregates(trips, dfc):
+    """
+    Build every aggregate the dashboard queries instead of scanning trips.
+
+    Args:
+        trips (pandas.DataFrame): The dashboard trip table.
+        dfc (pandas.DataFrame): Station coordinates from ``load_station_coordinates``.
+
+    Returns:
+        dict: The ``daily_aggregates``, ``trip_cube`` and ``station_activity``.
+    """
+    station_locations = align_stations(dfc, trips['Departure station'].cat.categories)
+    return {
+        'daily_aggregates': DailyAggregates(trips),
+        'trip_cube': TripCube(trips),
+        'station_activity': StationActivity(trips, station_locations['lat'].notna().values),
+    }
+
+
+def snapshot_version(manifest_path=MANIFEST_PATH, coordinates_path=COORDINATES_PATH):
+    """
+    Identify the inputs a snapshot is built from.
+
+    Args:
+        manifest_path (str): Location of the ingest manifest.
+        coordinates_path (str): Location of ``station_coordinates.csv``.
+
+    Returns:
+        str: The data version followed by a short hash of the station coordinates.
+    """
+    return f"{data_version(manifest_path)}-{file_checksum(coordinates_path)[:12]}"
+
+
+def snapshot_path(directory=SNAPSHOT_DIR, manifest_path=MANIFEST_PATH, coordinates_path=COORDINATES_PATH):
+    """
+    Locate the snapshot of the current data.
+
+    Args:
+        directory (str): Directory holding the snapshots.
+        manifest_path (str): Location of the ingest manifest.
+        coordinates_path (str): Location of ``station_coordinates.csv``.
+
+    Returns:
+        str: The directory of the snapshot for the current data version.
+    """
+    return os.path.join(directory, snapshot_version(manifest_path, coordinates_path))
+
+
+def code_version(source_dir=os.path.dirname(os.path.abspath(__file__))):
+    """
+    Identify the app's code, which the warm state is computed with.
+
+    Args:
+        source_dir (str): Directory of the app's modules.
+
+    Returns:
+        str: A short hash of every ``.py`` file in ``source_dir`` and of the
+            installed versions of ``VERSIONED_PACKAGES``.
+    """
+    digest = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(source_dir, '*.py'))):
+        with open(path, 'rb') as f:
+            digest.update(os.path.basename(path).encode())
+            digest.update(f.read())
+    for package in VERSIONED_PACKAGES:
+        try:
+            digest.update(f"{package}=={metadata.version(package)}".encode())
+        except metadata.PackageNotFoundError:
+            digest.update(f"{package} missing".encode())
+    return digest.hexdigest()[:12]
+
+
+def read_warm_state(snapshot_dir, version):
+    """
+    Load the warm state of a snapshot.
+
+    The file starts with the code version on a line of its own, which is
+    checked before anything is unpickled, so a state pickled by other code or
+    library versions is never loaded. A state that still cannot be unpickled
+    is logged and treated as missing, to be rebuilt.
+
+    Args:
+        snapshot_dir (str): Directory of the snapshot.
+        version (str): The ``code_version`` the state must have been computed with.
+
+    Returns:
+        dict: The warm state, or ``None`` if there is none for this code.
+    """
+    path = os.path.join(snapshot_dir, WARM_STATE_FILE)
+    try:
+        with open(path, 'rb') as f:
+            if f.readline().rstrip(b'\n') != version.encode():
+                return None
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        logger.warning("Warm state %s cannot be read, rebuilding it", path, exc_info=True)
+        return None
+
+
+@contextmanager
+def warm_state_lock(snapshot_dir):
+    """
+    Hold the lock serialising builds of a snapshot's warm state.
+
+    Args:
+        snapshot_dir (str): Directory of the snapshot.
+    """
+    with open(os.path.join(snapshot_dir, '.warm_state.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def write_warm_state(snapshot_dir, version, state):
+    """
+    Store the warm state of a snapshot, replacing one from other code.
+
+    Args:
+        snapshot_dir (str): Directory of the snapshot.
+        version (str): The ``code_version`` the state was computed with.
+        state (dict): The warm state.
+    """
+    path = os.path.join(snapshot_dir, WARM_STATE_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(version.encode() + b'\n')
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def write_table(df, path):
+    """
+    Write a DataFrame as an Arrow IPC file that can be read back without copies.
+
+    Args:
+        df (pandas.DataFrame): Table with datetime64, bool, categorical and
+            numeric columns, none of them holding Arrow nulls.
+        path (str): Destination of the file.
+    """
+    arrays = {}
+    columns = {}
+    for name, column in df.items():
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            arrays[name] = column.cat.codes.values
+            columns[name] = {
+                'kind': 'category',
+                'categories': column.cat.categories.astype(str).tolist(),
+                'ordered': bool(column.cat.ordered),
+            }
+        elif np.issubdtype(column.dtype, np.datetime64):
+            # NaT is stored as its int64 sentinel rather than as an Arrow null
+            arrays[name] = column.values.astype('datetime64[ns]').view(np.int64)
+            columns[name] = {'kind': 'datetime'}
+        elif column.dtype == bool:
+            arrays[name] = column.values.view(np.uint8)
+            columns[name] = {'kind': 'bool'}
+        else:
+            arrays[name] = column.values
+            columns[name] = {'kind': 'numeric'}
+
+    table = pa.table({name: pa.array(values) for name, values in arrays.items()})
+    table = table.replace_schema_metadata({COLUMNS_KEY: json.dumps(columns).encode()})
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def read_table(path):
+    """
+    Memory-map a file written by ``write_table`` as a DataFrame of read-only views.
+
+    Args:
+        path (str): Location of the file.
+
+    Returns:
+        pandas.DataFrame: The table, with every column backed by the mapped file.
+    """
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    columns = json.loads(table.schema.metadata[COLUMNS_KEY])
+
+    data = {}
+    for name, spec in columns.items():
+        chunks = table.column(name).chunks
+        values = chunks[0].to_numpy(zero_copy_only=True) if len(chunks) == 1 else table.column(name).to_numpy()
+        if spec['kind'] == 'category':
+            dtype = pd.CategoricalDtype(spec['categories'], ordered=spec['ordered'])
+            data[name] = pd.Categorical.from_codes(values, dtype=dtype)
+        elif spec['kind'] == 'datetime':
+            data[name] = values.view('datetime64[ns]')
+        elif spec['kind'] == 'bool':
+            data[name] = values.view(bool)
+        else:
+            data[name] = values
+
+    # copy=False keeps one block per column instead of consolidating (copying)
+    # columns of the same dtype into 2D blocks
+    return pd.DataFrame(data, copy=False)
+
+
+def write_aggregates(aggregates, directory):
+    """
+    Store aggregates with each numeric array in its own ``.npy`` file.
+
+    Args:
+        aggregates (dict): Aggregate objects keyed by name.
+        directory (str): Directory to write into.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for name, aggregate in aggregates.items():
+        attributes = {}
+        arrays = []
+        for attribute, value in vars(aggregate).items():
+            if isinstance(value, np.ndarray) and value.dtype != object and value.ndim:
+                np.save(os.path.join(directory, f"{name}.{attribute}.npy"), value)
+                arrays.append(attribute)
+            else:
+                attributes[attribute] = value
+
+        with open(os.path.join(directory, f"{name}.pkl"), 'wb') as f:
+            pickle.dump({'class': type(aggregate).__name__, 'attributes': attributes, 'arrays': arrays}, f)
+
+
+def read_aggregates(directory, names):
+    """
+    Load aggregates written by ``write_aggregates``, memory-mapping their arrays.
+
+    Args:
+        directory (str): Directory the aggregates were written to.
+        names (list): Names of the aggregates to load.
+
+    Returns:
+        dict: Aggregate objects keyed by name.
+    """
+    classes = {cls.__name__: cls for cls in (DailyAggregates, TripCube, StationActivity)}
+    aggregates = {}
+    for name in names:
+        with open(os.path.join(directory, f"{name}.pkl"), 'rb') as f:
+            state = pickle.load(f)
+
+        aggregate = classes[state['class']].__new__(classes[state['class']])
+        aggregate.__dict__.update(state['attributes'])
+        for attribute in state['arrays']:
+            setattr(aggregate, attribute, np.load(os.path.join(directory, f"{name}.{attribute}.npy"), mmap_mode='r'))
+        aggregates[name] = aggregate
+    return aggregates
+
+
+def write_snapshot(directory=SNAPSHOT_DIR, manifest_path=MANIFEST_PATH, raw_dir=RAW_DIR, trips=None,
+                   coordinates_path=COORDINATES_PATH):
+    """
+    Build and write the snapshot for the current data, removing older snapshots.
+
+    Files of older snapshots are unlinked rather than overwritten, so workers
+    still mapping them keep working until they restart.
+
+    Args:
+        directory (str): Directory holding the snapshots.
+        manifest_path (str): Location of the ingest manifest.
+        raw_dir (str): Directory holding the monthly raw exports.
+        trips (pandas.DataFrame): The processed trip table, if already loaded.
+        coordinates_path (str): Location of ``station_coordinates.csv``.
+
+    Returns:
+        str: The version of the snapshot written.
+    """
+    version = snapshot_version(manifest_path, coordinates_path)
+    if trips is None:
+        trips = load_trips(manifest_path, raw_dir)
+    trips = dashboard_trips(trips)
+
+    # Build next to the destination then swap, so no worker sees a partial snapshot
+    os.makedirs(directory, exist_ok=True)
+    tmp_dir = os.path.join(directory, f".{version}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    write_table(trips, os.path.join(tmp_dir, 'trips.arrow'))
+    write_aggregates(build_aggregates(trips, load_station_coordinates(coordinates_path)), tmp_dir)
+
+    target = os.path.join(directory, version)
+    try:
+        os.rename(tmp_dir, target)
+    except OSError:
+        # Another process wrote the same version first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    for path in glob.glob(os.path.join(directory, '*')):
+        if os.path.basename(path) != version and not os.path.basename(path).startswith('.'):
+            shutil.rmtree(path, ignore_errors=True)
+    return version
+
+
+def load_snapshot(directory=SNAPSHOT_DIR, manifest_path=MANIFEST_PATH, raw_dir=RAW_DIR, start_date=None, end_date=None,
+                  coordinates_path=COORDINATES_PATH):
+    """
+    Map the dashboard trip table and aggregates, writing the snapshot first if needed.
+
+    With a date window the snapshot is not used: only the partitions covering
+    the window are read (see ``ingest.load_trips``), and no aggregates are
+    returned since the stored ones cover the whole table.
+
+    Args:
+        directory (str): Directory holding the snapshots.
+        manifest_path (str): Location of the ingest manifest.
+        raw_dir (str): Directory holding the monthly raw exports.
+        start_date (str): First day to keep, or ``None`` to start at the first trip.
+        end_date (str): Last day to keep, or ``None`` to end at the last trip.
+        coordinates_path (str): Location of ``station_coordinates.csv``.
+
+    Returns:
+        tuple: The dashboard trip table and a dict of aggregates (or ``None``).
+    """
+    ensure_ingested(raw_dir, manifest_path)
+    if start_date is not None or end_date is not None:
+        return dashboard_trips(load_trips(manifest_path, raw_dir, start_date, end_date)), None
+
+    snapshot_dir = snapshot_path(directory, manifest_path, coordinates_path)
+    if not os.path.exists(snapshot_dir):
+        # Workers booting together build the snapshot once; the others wait for it
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if not os.path.exists(snapshot_dir):
+                write_snapshot(directory, manifest_path, raw_dir, coordinates_path=coordinates_path)
+
+    trips = read_table(os.path.join(snapshot_dir, 'trips.arrow'))
+    log_memory_usage(trips)
+    return trips, read_aggregates(snapshot_dir, ['daily_aggregates', 'trip_cube', 'station_activity'])
@@ -0,0 +1,9 @@
+"""
+Shared setup of the tests: the app's modules are imported from ``src``, as
+when the app is run from that directory.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
@@ -0,0 +1,158 @@
+"""
+Tests of the in-process result caches.
+"""
+
+import threading
+import time
+
+from cache import LRUCache, SingleFlight, canonical, memoize
+
+
+def wait_until(condition, timeout=5):
+    """Poll ``condition`` until it holds, failing after ``timeout`` seconds."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_evicts_least_recently_used_entry_beyond_max_entries():
+    cache = LRUCache(max_entries=2)
+    cache.put('a', 'A')
+    cache.put('b', 'B')
+    cache.get('a')
+    cache.put('c', 'C')
+
+    assert 'a' in cache and 'c' in cache and 'b' not in cache
+    assert cache.stats()['evictions'] == 1
+
+
+def test_evicts_entries_beyond_max_bytes():
+    cache = LRUCache(max_bytes=10)
+    cache.put('a', 'x' * 6)
+    cache.put('b', 'y' * 6)
+
+    assert list(dict(cache.items())) == ['b']
+    assert cache.current_bytes == 6
+
+
+def test_skips_values_larger_than_the_cache():
+    cache = LRUCache(max_bytes=10)
+    cache.put('a', 'x' * 11)
+
+    assert 'a' not in cache
+    assert cache.current_bytes == 0
+
+
+def test_replacing_an_entry_keeps_the_size_exact():
+    cache = LRUCache()
+    cache.put('a', 'x' * 6)
+    cache.put('a', 'x' * 2)
+
+    assert cache.current_bytes == 2
+
+
+def test_expires_entries_older_than_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    cache = LRUCache(ttl=10)
+    cache.put('a', 'A')
+
+    now[0] += 10
+    assert cache.get('a') == 'A'
+    now[0] += 1
+    assert cache.get('a') is None
+
+    stats = cache.stats()
+    assert stats['expirations'] == 1
+    assert stats['entries'] == 0 and stats['bytes'] == 0
+
+
+def test_get_or_compute_counts_hits_and_misses():
+    cache = LRUCache()
+    assert cache.get_or_compute('a', lambda: 'A') == 'A'
+    assert cache.get_or_compute('a', lambda: 'other') == 'A'
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['hit_rate']) == (1, 1, 0.5)
+
+
+def test_concurrent_misses_compute_once():
+    cache = LRUCache()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'A'
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_compute('a', compute)))
+    leader.start()
+    started.wait(5)
+    followers = [
+        threading.Thread(target=lambda: results.append(cache.get_or_compute('a', compute))) for _ in range(4)
+    ]
+    for thread in followers:
+        thread.start()
+    # Let the followers reach the computation in progress before it ends
+    wait_until(lambda: cache.stats()['coalesced'] == 4)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+
+    assert results == ['A'] * 5
+    assert len(calls) == 1
+
+
+def test_single_flight_shares_the_leader_exception():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    errors = []
+
+    def compute():
+        started.set()
+        release.wait(5)
+        raise ValueError("failed")
+
+    def call():
+        try:
+            flight.do('a', compute)
+        except ValueError as error:
+            errors.append(error)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=call)
+    follower.start()
+    wait_until(lambda: flight.coalesced == 1)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert len(errors) == 2 and errors[0] is errors[1]
+
+
+def test_canonical_keys_ignore_dict_and_set_order():
+    assert canonical(({'b': [1, 2], 'a': {3, 1}},)) == canonical(({'a': {1, 3}, 'b': (1, 2)},))
+    assert canonical(([1, 2],)) != canonical(([2, 1],))
+
+
+def test_memoize_clears_the_cache_when_the_version_changes():
+    version = ['v1']
+    calls = []
+
+    @memoize(LRUCache(), version=lambda: version[0])
+    def double(value):
+        calls.append(value)
+        return value * 2
+
+    assert double(2) == 4 and double(2) == 4
+    version[0] = 'v2'
+    assert double(2) == 4
+    assert calls == [2, 2]
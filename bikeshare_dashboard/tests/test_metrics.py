@@ -0,0 +1,93 @@
+"""
+Tests of the callback metrics and their Prometheus rendering.
+"""
+
+import multiprocessing
+
+import pytest
+from dash.exceptions import PreventUpdate
+
+from cache import LRUCache
+from metrics import CallbackMetrics, Histogram, JobMetrics, render_cache_stats
+
+
+def test_histogram_counts_are_cumulative():
+    histogram = Histogram((1, 10))
+    for value in (0.5, 1, 5, 50):
+        histogram.observe(value)
+
+    assert histogram.cumulative_counts() == [(1, 2), (10, 3), ('+Inf', 4)]
+    assert (histogram.count, histogram.total) == (4, 56.5)
+
+
+def test_instrument_records_outcomes_and_sizes():
+    metrics = CallbackMetrics()
+    ok = metrics.instrument('ok', lambda: 'abc')
+    prevented = metrics.instrument('prevented', _raise(PreventUpdate))
+    failed = metrics.instrument('failed', _raise(ValueError))
+
+    assert ok() == 'abc'
+    with pytest.raises(PreventUpdate):
+        prevented()
+    with pytest.raises(ValueError):
+        failed()
+
+    assert metrics.calls == {('ok', 'ok'): 1, ('prevented', 'prevented'): 1, ('failed', 'error'): 1}
+    assert metrics.size['ok'].total == 3
+    assert metrics.size['failed'].count == 0
+    assert all(metrics.latency[name].count == 1 for name in ('ok', 'prevented', 'failed'))
+
+
+def test_slow_calls_are_logged_with_their_inputs(caplog):
+    metrics = CallbackMetrics(slow_seconds=0)
+    metrics.instrument('slow', lambda value: value)('input')
+
+    assert "slow took" in caplog.text and "'input'" in caplog.text
+
+
+def test_render_has_one_series_per_callback():
+    metrics = CallbackMetrics()
+    metrics.observe('update_map', 0.2, 1000, 'ok')
+    body = metrics.render()
+
+    assert '# TYPE dash_callback_duration_seconds histogram' in body
+    assert 'dash_callback_duration_seconds_bucket{callback="update_map",le="0.25"} 1' in body
+    assert 'dash_callback_response_bytes_sum{callback="update_map"} 1000' in body
+    assert 'dash_callback_calls_total{callback="update_map",outcome="ok"} 1' in body
+
+
+def test_render_cache_stats():
+    cache = LRUCache()
+    cache.get_or_compute('a', lambda: 'A')
+    body = render_cache_stats({'maps': cache})
+
+    assert 'dash_cache_misses_total{cache="maps"} 1' in body
+    assert 'dash_cache_bytes{cache="maps"} 1' in body
+
+
+def test_job_metrics_add_up_the_calls_of_every_process(tmp_path):
+    directory = str(tmp_path / 'metrics')
+    processes = [
+        multiprocessing.get_context('fork').Process(target=_render_in_job, args=(directory,)) for _ in range(3)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+
+    # Read by another worker than the ones whose jobs ran
+    body = JobMetrics(directory).render()
+    assert 'dash_job_duration_seconds_count{job="render_map"} 3' in body
+    assert 'dash_job_response_bytes_sum{job="render_map"} 12' in body
+    assert 'dash_job_calls_total{job="render_map",outcome="ok"} 3' in body
+    assert 'dash_callback' not in body
+
+
+def _render_in_job(directory):
+    JobMetrics(directory).instrument('render_map', lambda: 'html')()
+
+
+def _raise(error):
+    def raises():
+        raise error
+    return raises
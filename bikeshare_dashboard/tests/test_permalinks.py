@@ -0,0 +1,100 @@
+"""
+Tests of the Trends and Map permalinks and their visit counts.
+"""
+
+import pytest
+
+from permalinks import VisitLog, canonical_permalink, map_permalink, parse_permalink, trends_permalink
+
+
+def test_trends_permalink_round_trip():
+    args = ('electric', ['VIP', 'all'], 'covered distance', [1, 2])
+
+    assert parse_permalink(*trends_permalink(*args)) == ('trends', args)
+
+
+def test_map_permalink_round_trip():
+    args = ([2, 5], 'classic', 'density plot', 'top10')
+
+    assert parse_permalink(*map_permalink(*args)) == ('map', args)
+
+
+def test_memberships_are_written_sorted_once():
+    pathname, search = trends_permalink('both', ['VIP', 'all', 'VIP'], 'departure count', [0, 3])
+
+    assert search.count('selected_membership') == 2
+    assert search.index('VIP') < search.index('selected_membership=all')
+    assert parse_permalink(pathname, search)[1][1] == ['VIP', 'all']
+
+
+def test_permalink_under_a_path_prefix():
+    pathname, search = map_permalink([0, 11], 'both', 'marker plot', 'all')
+
+    assert parse_permalink('/dashboard' + pathname + '/', search.lstrip('?'))[0] == 'map'
+
+
+def test_legacy_list_literals_are_read():
+    search = (
+        "selected_bike=both&selected_membership=['all', '24 Hour']"
+        "&selected_view=departure count&selected_season=[0, 3]"
+    )
+
+    assert parse_permalink('/trends/departure%20count', search) == (
+        'trends', ('both', ['24 Hour', 'all'], 'departure count', [0, 3])
+    )
+
+
+def test_view_defaults_to_the_path():
+    search = "bike_type=both&freq_type=all&map_month_range=0&map_month_range=11"
+
+    assert parse_permalink('/map/density%20plot', search)[1][2] == 'density plot'
+
+
+@pytest.mark.parametrize('pathname, search', [
+    ('/', ''),
+    ('/overview/x', ''),
+    # Values the filters do not offer
+    ('/trends/departure%20count', 'selected_bike=both&selected_membership=evil&selected_season=0&selected_season=3'),
+    ('/trends/departure%20count', 'selected_bike=unicycle&selected_membership=all&selected_season=0&selected_season=3'),
+    ('/trends/speed', 'selected_bike=both&selected_membership=all&selected_season=0&selected_season=3'),
+    ('/map/marker%20plot', 'bike_type=both&freq_type=top3&map_month_range=0&map_month_range=11'),
+    # Missing, reversed and out of range sliders
+    ('/trends/departure%20count', 'selected_bike=both&selected_membership=all'),
+    ('/trends/departure%20count', 'selected_bike=both&selected_membership=all&selected_season=3&selected_season=0'),
+    ('/map/marker%20plot', 'bike_type=both&freq_type=all&map_month_range=0&map_month_range=12'),
+    # Malformed literals and numbers
+    ('/trends/departure%20count', "selected_bike=both&selected_membership=['all'&selected_season=[0, 3]"),
+    ('/trends/departure%20count', "selected_bike=both&selected_membership=[['all']]&selected_season=[0, 3]"),
+    ('/trends/departure%20count', "selected_bike=both&selected_membership=all&selected_season=[{}, 3]"),
+    ('/map/marker%20plot', 'bike_type=both&freq_type=all&map_month_range=x&map_month_range=11'),
+])
+def test_invalid_permalinks_are_ignored(pathname, search):
+    assert parse_permalink(pathname, search) is None
+
+
+def test_canonical_permalink_is_the_same_however_the_link_was_written():
+    legacy = parse_permalink(
+        '/trends/departure%20count',
+        "selected_bike=both&selected_membership=['VIP', 'all', 'VIP']&selected_season=[0, 3]"
+    )
+    current = parse_permalink(*trends_permalink('both', ['all', 'VIP'], 'departure count', [0, 3]))
+
+    assert canonical_permalink(*legacy) == canonical_permalink(*current)
+
+
+def test_visit_log_counts_visits(tmp_path):
+    log = VisitLog(str(tmp_path / 'jobs' / 'permalinks.db'))
+    assert log.top(5) == []
+
+    for url in ('/map/a', '/trends/b', '/map/a'):
+        log.record(url)
+
+    assert log.top(5) == [('/map/a', 2), ('/trends/b', 1)]
+    assert log.top(1) == [('/map/a', 2)]
+
+
+def test_visit_log_failures_do_not_raise(tmp_path):
+    (tmp_path / 'file').write_text('')
+    log = VisitLog(str(tmp_path / 'file' / 'permalinks.db'))
+
+    log.record('/map/a')
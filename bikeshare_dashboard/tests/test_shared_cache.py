@@ -0,0 +1,164 @@
+"""
+Tests of the result cache shared by the workers, on SQLite and on Redis.
+"""
+
+import os
+import pickle
+import threading
+import time
+
+import pytest
+
+import shared_cache
+from shared_cache import RedisBackend, SharedCache, SQLiteBackend, shared_cache_from_url
+
+
+@pytest.fixture(params=['sqlite', 'redis'])
+def backend(request, tmp_path, monkeypatch):
+    if request.param == 'sqlite':
+        return SQLiteBackend(str(tmp_path / 'cache.db'))
+
+    fakeredis = pytest.importorskip('fakeredis')
+    redis = pytest.importorskip('redis')
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        redis.Redis, 'from_url', classmethod(lambda cls, url, **kwargs: fakeredis.FakeRedis(server=server))
+    )
+    return RedisBackend('redis://localhost:6379/0')
+
+
+def test_get_set_delete_and_clear(backend):
+    backend.set('app:v1:a', b'A')
+    backend.set('app:v1:b', b'B')
+    backend.set('other:v1:a', b'C')
+    assert backend.get('app:v1:a') == b'A'
+
+    backend.delete('app:v1:a')
+    assert backend.get('app:v1:a') is None
+
+    backend.clear('app:')
+    assert backend.get('app:v1:b') is None
+    assert backend.get('other:v1:a') == b'C'
+
+
+def test_lock_is_exclusive_until_released(backend):
+    other = _other_worker(backend)
+    assert backend.acquire('lock', 30)
+    assert not other.acquire('lock', 30)
+
+    backend.release('lock')
+    assert other.acquire('lock', 30)
+
+
+def test_expired_lock_can_be_taken(backend):
+    other = _other_worker(backend)
+    assert backend.acquire('lock', 0.05)
+    time.sleep(0.1)
+    assert other.acquire('lock', 30)
+
+
+def test_release_keeps_a_lock_taken_by_another_worker(backend):
+    other = _other_worker(backend)
+    third = _other_worker(backend)
+    assert backend.acquire('lock', 0.05)
+    time.sleep(0.1)
+    assert other.acquire('lock', 30)
+
+    # The first owner's lock expired, so releasing it leaves the new owner's
+    backend.release('lock')
+    assert not third.acquire('lock', 30)
+
+
+def test_sqlite_evicts_least_recently_read_values(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(shared_cache.time, 'time', lambda: now[0])
+    backend = SQLiteBackend(str(tmp_path / 'cache.db'), max_bytes=10)
+    backend.set('a', b'x' * 4)
+    now[0] += 1
+    backend.set('b', b'y' * 4)
+
+    # Reading 'a' after ACCESS_RESOLUTION makes 'b' the least recently read
+    now[0] += shared_cache.ACCESS_RESOLUTION + 1
+    backend.get('a')
+    backend.set('c', b'z' * 4)
+
+    assert backend.get('a') is not None and backend.get('c') is not None
+    assert backend.get('b') is None
+
+
+def test_shared_cache_computes_a_result_once(tmp_path):
+    cache = SharedCache(SQLiteBackend(str(tmp_path / 'cache.db')))
+    other = SharedCache(SQLiteBackend(str(tmp_path / 'cache.db')))
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {'value': 1}
+
+    assert cache.get_or_compute('v1', 'f', ('a',), compute) == {'value': 1}
+    assert other.get_or_compute('v1', 'f', ('a',), compute) == {'value': 1}
+    assert other.get_or_compute('v2', 'f', ('a',), compute) == {'value': 1}
+
+    assert len(calls) == 2
+    assert cache.stats()['misses'] == 1
+    assert (other.stats()['hits'], other.stats()['misses']) == (1, 1)
+
+
+def test_shared_cache_waits_for_another_worker_computing(tmp_path):
+    cache = SharedCache(SQLiteBackend(str(tmp_path / 'cache.db')))
+    other = SharedCache(SQLiteBackend(str(tmp_path / 'cache.db')))
+    started = threading.Event()
+    release = threading.Event()
+
+    def compute():
+        started.set()
+        release.wait(5)
+        return 'A'
+
+    leader = threading.Thread(target=cache.get_or_compute, args=('v1', 'f', ('a',), compute))
+    leader.start()
+    started.wait(5)
+    threading.Timer(0.2, release.set).start()
+    result = other.get_or_compute('v1', 'f', ('a',), lambda: 'computed twice')
+    leader.join(5)
+
+    assert result == 'A'
+    assert other.stats()['coalesced'] == 1
+
+
+def test_unreadable_entries_are_recomputed(tmp_path):
+    cache = SharedCache(SQLiteBackend(str(tmp_path / 'cache.db')))
+    key = cache.key('v1', 'f', ('a',))
+    cache.backend.set(key, pickle.dumps('A')[:-2])
+
+    assert cache.get_or_compute('v1', 'f', ('a',), lambda: 'B') == 'B'
+    assert pickle.loads(cache.backend.get(key)) == 'B'
+    assert cache.stats()['errors'] == 1
+
+
+def test_backend_errors_fall_back_to_computing(tmp_path):
+    class BrokenBackend:
+        def get(self, key):
+            raise OSError("unreachable")
+
+    cache = SharedCache(BrokenBackend())
+
+    assert cache.get_or_compute('v1', 'f', ('a',), lambda: 'A') == 'A'
+    assert cache.stats()['errors'] == 1
+
+
+def test_sqlite_urls_follow_sqlalchemy():
+    assert shared_cache_from_url('sqlite:////tmp/cache.db').backend.path == '/tmp/cache.db'
+    assert shared_cache_from_url('sqlite:///cache.db').backend.path == 'cache.db'
+    assert not os.path.isabs(shared_cache_from_url('sqlite:///tmp/cache.db').backend.path)
+    assert shared_cache_from_url('') is None
+    with pytest.raises(ValueError):
+        shared_cache_from_url('memcached://localhost')
+
+
+def _other_worker(backend):
+    """A backend on the same store, with its own lock tokens, as in another worker."""
+    if isinstance(backend, SQLiteBackend):
+        return SQLiteBackend(backend.path)
+    # The client factory is patched to reach the same fake server
+    return RedisBackend('redis://localhost:6379/0')
@@ -0,0 +1,64 @@
+"""
+Tests of the warm state stored with a snapshot.
+"""
+
+import os
+import pickle
+import threading
+
+import pytest
+
+from snapshot import WARM_STATE_FILE, code_version, read_warm_state, warm_state_lock, write_warm_state
+
+
+def test_warm_state_round_trip(tmp_path):
+    write_warm_state(str(tmp_path), 'abc', {'placeholders': [1, 2]})
+
+    assert read_warm_state(str(tmp_path), 'abc') == {'placeholders': [1, 2]}
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+
+def test_warm_state_starts_with_the_code_version(tmp_path):
+    write_warm_state(str(tmp_path), 'abc', {})
+
+    with open(tmp_path / WARM_STATE_FILE, 'rb') as f:
+        assert f.readline() == b'abc\n'
+
+
+def test_warm_state_of_other_code_is_not_unpickled(tmp_path, monkeypatch):
+    write_warm_state(str(tmp_path), 'abc', {})
+    monkeypatch.setattr(pickle, 'load', lambda f: pytest.fail("unpickled a state of other code"))
+
+    assert read_warm_state(str(tmp_path), 'other') is None
+
+
+def test_missing_or_unreadable_warm_state_is_rebuilt(tmp_path):
+    assert read_warm_state(str(tmp_path), 'abc') is None
+
+    with open(tmp_path / WARM_STATE_FILE, 'wb') as f:
+        f.write(b'abc\n' + pickle.dumps({'placeholders': []})[:-3])
+    assert read_warm_state(str(tmp_path), 'abc') is None
+
+
+def test_warm_state_lock_waits_for_the_builder(tmp_path):
+    built = threading.Event()
+
+    def build():
+        with warm_state_lock(str(tmp_path)):
+            built.set()
+
+    with warm_state_lock(str(tmp_path)):
+        other = threading.Thread(target=build)
+        other.start()
+        assert not built.wait(0.2)
+    other.join(5)
+    assert built.is_set()
+
+
+def test_code_version_follows_the_source(tmp_path):
+    (tmp_path / 'app.py').write_text("x = 1\n")
+    before = code_version(str(tmp_path))
+    assert code_version(str(tmp_path)) == before
+
+    (tmp_path / 'app.py').write_text("x = 2\n")
+    assert code_version(str(tmp_path)) != before